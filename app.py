@@ -1,86 +1,917 @@
-from flask import Flask, request, jsonify, render_template
-import pandas as pd
-import numpy as np
+import time
+_IMPORT_STARTED = time.perf_counter()  # cold-start clock, reported as STARTUP_SECONDS
+
+from flask import Flask, Response, g, request, jsonify, render_template, stream_with_context
 import re
 import os
-from typing import Dict, List, Any, Tuple, Optional, Set
+import sys
+import copy
+import json
+import logging
+import atexit
+import bisect
+import heapq
+import itertools
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Any, Tuple, Optional, Set, Iterable, Iterator
 from datetime import datetime
 import warnings
+import threading
+import multiprocessing
 warnings.filterwarnings('ignore')
 
+STARTUP_BUDGET_MS = float(os.environ.get('STARTUP_BUDGET_MS', 1500))
+
+# Logging: LOG_LEVEL gates the records (DEBUG adds per-request extraction
+# and generation traces, which cost one isEnabledFor() check otherwise),
+# LOG_FORMAT is "text" or "json" (one object per line, extra fields included).
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').strip().upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text').strip().lower()
+if LOG_FORMAT not in ('text', 'json'):
+    raise ValueError(f"LOG_FORMAT must be 'text' or 'json', got {LOG_FORMAT!r}")
+
+_LOG_RECORD_FIELDS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JSONLogFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message and any `extra` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _LOG_RECORD_FIELDS)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _StdoutHandler(logging.StreamHandler):
+    """Writes to the current sys.stdout, so redirect_stdout() still silences it"""
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+log = logging.getLogger('testit')
+log.setLevel(LOG_LEVEL)
+log.propagate = False
+_log_handler = _StdoutHandler()
+_log_handler.setFormatter(JSONLogFormatter() if LOG_FORMAT == 'json' else logging.Formatter('%(message)s'))
+log.addHandler(_log_handler)
+
 # Initialize Flask app
 app = Flask(__name__)
 
-# Global variables for spaCy (will try to import if available)
+# Cell 1: Optional NLP Libraries
+# The serving path imports only what it uses: no pandas/numpy/IPython here.
+# Heavy optional modules are imported by the code that needs them.
+
+# spaCy is optional and never installed at runtime. SPACY_MODE selects
+# when it is loaded: "off" (default, regex engine only), "lazy" (on first
+# use) or "eager" (while the generator engine is built). The Matcher only
+# reads lexical token attributes, so SPACY_PIPELINE="tokenizer" (default)
+# uses a blank English tokenizer; "full" loads every SPACY_MODEL component.
+SPACY_MODE = os.environ.get('SPACY_MODE', 'off').strip().lower()
+SPACY_MODEL = os.environ.get('SPACY_MODEL', 'en_core_web_sm')
+SPACY_PIPELINE = os.environ.get('SPACY_PIPELINE', 'tokenizer').strip().lower()
+SPACY_BATCH_SIZE = int(os.environ.get('SPACY_BATCH_SIZE', 128))
+SPACY_N_PROCESS = int(os.environ.get('SPACY_N_PROCESS', 1))
+
+# Which extractor finds VLAN/line/PBIT mentions: "regex" (pattern scanner),
+# "matcher" (spaCy Matcher on token boundaries) or "auto" (matcher when
+# spaCy is enabled and loads, regex otherwise). Enabling spaCy alone never
+# switches engines; benchmarks/engine_report.py --check verifies they agree.
+EXTRACTION_ENGINES = ('regex', 'matcher', 'auto')
+EXTRACTION_ENGINE = os.environ.get('EXTRACTION_ENGINE', 'regex').strip().lower()
+if EXTRACTION_ENGINE not in EXTRACTION_ENGINES:
+    raise ValueError(f"EXTRACTION_ENGINE must be one of {', '.join(EXTRACTION_ENGINES)}, got {EXTRACTION_ENGINE!r}")
+if EXTRACTION_ENGINE == 'matcher' and SPACY_MODE == 'off':
+    SPACY_MODE = 'lazy'  # the matcher engine needs spaCy
 SPACY_AVAILABLE = False
 nlp = None
+_spacy_attempted = False
+_spacy_lock = threading.Lock()
 
-# Try to load spaCy for advanced NLP
-# Cell 1: Enhanced Imports with NLP Libraries (Same as before)
-import pandas as pd
-import numpy as np
-import re
-import os
-from typing import Dict, List, Any, Tuple, Optional, Set
-from datetime import datetime
-import warnings
-warnings.filterwarnings('ignore')
+def load_spacy():
+    """Load the configured spaCy model once; None when disabled or unavailable"""
+    global nlp, SPACY_AVAILABLE, _spacy_attempted
+    if SPACY_MODE == 'off':
+        return None
+    
+    with _spacy_lock:
+        if not _spacy_attempted:
+            _spacy_attempted = True
+            try:
+                import spacy
+                if SPACY_PIPELINE == 'full':
+                    nlp = spacy.load(SPACY_MODEL)
+                    log.info("✓ spaCy model %s loaded", SPACY_MODEL)
+                else:
+                    nlp = spacy.blank('en')
+                    log.info("✓ spaCy English tokenizer loaded")
+                SPACY_AVAILABLE = True
+            except ImportError:
+                log.warning("⚠ spaCy not installed. Using regex engine.")
+            except OSError:
+                log.warning("⚠ spaCy model %s not found (install it with: python -m spacy download %s). "
+                            "Using regex engine.", SPACY_MODEL, SPACY_MODEL)
+    return nlp
 
-# Install and import spaCy for advanced NLP
-try:
-    import spacy
-    from spacy.matcher import Matcher
-    from spacy.util import filter_spans
-    # Try to load English model
-    try:
-        nlp = spacy.load("en_core_web_sm")
-        SPACY_AVAILABLE = True
-        print("✓ spaCy English model loaded successfully")
-    except OSError:
-        print("⚠ spaCy English model not found. Installing...")
-        import subprocess
-        subprocess.run(["python", "-m", "spacy", "download", "en_core_web_sm"],
-                      capture_output=True)
-        try:
-            nlp = spacy.load("en_core_web_sm")
-            SPACY_AVAILABLE = True
-            print("✓ spaCy English model installed and loaded")
-        except:
-            SPACY_AVAILABLE = False
-            print("✗ spaCy model installation failed. Using regex fallback.")
-except ImportError:
-    SPACY_AVAILABLE = False
-    print("⚠ spaCy not available. Installing...")
-    import subprocess
-    subprocess.run(["pip", "install", "spacy"], capture_output=True)
+log.info("✓ Enhanced libraries imported successfully")
+
+
+# Metrics: Prometheus text exposition format, no client library needed.
+# Values are per process. With several gunicorn workers behind one port,
+# set METRICS_DIR to a directory shared by the workers: each one writes its
+# values to a file there, and /metrics sums the files, so any worker
+# answers a scrape with the totals of all of them.
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', 1.0))
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self._values = {}  # label values -> float
+        self._lock = threading.Lock()
+
+    def set(self, value: float, *labels: str):
+        with self._lock:
+            self._values[labels] = value
+
+    def snapshot(self) -> Dict[Tuple[str, ...], Any]:
+        with self._lock:
+            return dict(self._values)
+
+    def merge(self, processes: List[Tuple[int, bool, Dict[str, Any]]]) -> Dict[Tuple[str, ...], Any]:
+        """Values summed over every process that wrote a file, live or not, so totals never go down"""
+        merged = {}
+        for _, _, metrics in processes:
+            for labels, value in metrics.get(self.name, ()):
+                merged[tuple(labels)] = merged.get(tuple(labels), 0.0) + value
+        return merged
+
+    def _labels(self, labels: Tuple[str, ...], extra: str = '') -> str:
+        # A value beyond labelnames is the pid of a per-worker gauge series
+        pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(self.labelnames + ('pid',), labels)]
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def samples(self, values: Optional[Dict[Tuple[str, ...], Any]] = None) -> Iterator[str]:
+        for labels, value in sorted((self.snapshot() if values is None else values).items()):
+            yield f"{self.name}{self._labels(labels)} {_format_value(value)}"
+
+    def render(self, values: Optional[Dict[Tuple[str, ...], Any]] = None) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}", *self.samples(values)]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+
+class Gauge(_Metric):
+    """Last value set. Across METRICS_DIR workers, multiprocess_mode 'sum' adds
+    the live workers' values and 'all' keeps one series per live worker,
+    labelled with its pid."""
+    kind = 'gauge'
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (), multiprocess_mode: str = 'all'):
+        super().__init__(name, help_text, labelnames)
+        self.multiprocess_mode = multiprocess_mode
+
+    def merge(self, processes: List[Tuple[int, bool, Dict[str, Any]]]) -> Dict[Tuple[str, ...], Any]:
+        merged = {}
+        for pid, alive, metrics in processes:
+            if not alive:
+                continue
+            for labels, value in metrics.get(self.name, ()):
+                key = tuple(labels) + ((str(pid),) if self.multiprocess_mode == 'all' else ())
+                merged[key] = merged.get(key, 0.0) + value
+        return merged
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram; observe() is a bisect and three additions"""
+    kind = 'histogram'
+
+    DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = buckets
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)  # first bucket with le >= value (+Inf if none)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def snapshot(self) -> Dict[Tuple[str, ...], Any]:
+        with self._lock:
+            return {labels: [list(counts), total] for labels, (counts, total) in self._values.items()}
+
+    def merge(self, processes: List[Tuple[int, bool, Dict[str, Any]]]) -> Dict[Tuple[str, ...], Any]:
+        merged = {}
+        for _, _, metrics in processes:
+            for labels, (counts, total) in metrics.get(self.name, ()):
+                series = merged.setdefault(tuple(labels), [[0] * (len(self.buckets) + 1), 0.0])
+                series[0] = [merged_count + count for merged_count, count in zip(series[0], counts)]
+                series[1] += total
+        return merged
+
+    def samples(self, values: Optional[Dict[Tuple[str, ...], Any]] = None) -> Iterator[str]:
+        for labels, (counts, total) in sorted((self.snapshot() if values is None else values).items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else _format_value(bound)
+                bucket_labels = self._labels(labels, f'le="{le}"')
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            yield f"{self.name}_sum{self._labels(labels)} {_format_value(total)}"
+            yield f"{self.name}_count{self._labels(labels)} {cumulative}"
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _pid_alive(pid: int) -> bool:
     try:
-        import spacy
-        nlp = spacy.load("en_core_web_sm")
-        SPACY_AVAILABLE = True
-        print("✓ spaCy installed and loaded")
-    except:
-        SPACY_AVAILABLE = False
-        print("✗ spaCy installation failed. Using regex fallback.")
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # exists, owned by another user
+    return True
+
+
+class MetricsRegistry:
+    """Metrics in registration order; collectors refresh gauges right before each scrape.
+
+    With a directory, every process that serves requests writes its values
+    to <directory>/<pid>-<start ns>.json every flush_seconds (and on exit)
+    from a daemon thread, and render() merges all files: counters and
+    histograms are summed over every file, dead workers included, so they
+    stay monotonic across worker restarts; gauges combine per
+    Gauge.multiprocess_mode over live workers. Files are replaced
+    atomically. Empty the directory when the server starts.
+    """
+
+    def __init__(self, directory: str = '', flush_seconds: float = 1.0):
+        self._metrics = []
+        self._collectors = []
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        self._path = None
+        self._path_pid = None  # a forked worker gets its own file and flusher
+        self._flush_lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
 
-# For interactive input
-try:
-    import ipywidgets as widgets
-    from IPython.display import display, HTML, clear_output
-    WIDGETS_AVAILABLE = True
-except ImportError:
-    WIDGETS_AVAILABLE = False
+    def start_flushing(self):
+        """Start writing this process's file; called per request, a no-op once running"""
+        if not self.directory or self._path_pid == os.getpid():
+            return
+        with self._flush_lock:
+            pid = os.getpid()
+            if self._path_pid == pid:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            self._path = os.path.join(self.directory, f"{pid}-{time.time_ns()}.json")
+            self._path_pid = pid
+        threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True).start()
+        atexit.register(self.flush)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            try:
+                self.flush()
+            except Exception:
+                log.exception("Writing metrics to %s failed", self._path)
+
+    def _collect(self):
+        for collector in self._collectors:
+            collector()
+
+    def flush(self):
+        """Write this process's current values to its file"""
+        self.start_flushing()
+        self._collect()
+        data = {
+            'pid': os.getpid(),
+            'metrics': {metric.name: [[list(labels), value] for labels, value in metric.snapshot().items()]
+                        for metric in self._metrics},
+        }
+        with self._flush_lock:
+            with open(self._path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(self._path + '.tmp', self._path)
+
+    def _read_processes(self) -> List[Tuple[int, bool, Dict[str, Any]]]:
+        processes = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue  # removed since listdir
+            processes.append((data['pid'], _pid_alive(data['pid']), data['metrics']))
+        return processes
+
+    def render(self) -> str:
+        if self.directory:
+            self.flush()  # this worker's values are current; the others lag by at most flush_seconds
+            processes = self._read_processes()
+            lines = []
+            for metric in self._metrics:
+                lines.extend(metric.render(metric.merge(processes)))
+            return "\n".join(lines) + "\n"
+        self._collect()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry(METRICS_DIR, METRICS_FLUSH_SECONDS)
+REQUESTS_TOTAL = METRICS.register(Counter(
+    'testit_requests_total', "HTTP API requests by endpoint and outcome (success/error)", ('endpoint', 'outcome')))
+REQUEST_SECONDS = METRICS.register(Histogram(
+    'testit_request_duration_seconds', "Time to build the HTTP response (streamed bodies excluded)", ('endpoint',)))
+STAGE_SECONDS = METRICS.register(Histogram(
+    'testit_stage_duration_seconds', "Pipeline stage latency by VSI scenario", ('stage', 'scenario')))
+BATCH_ITEMS_TOTAL = METRICS.register(Counter(
+    'testit_batch_items_total', "Batch items by outcome (success/error)", ('outcome',)))
+
+# stages is set to a list while a batch pool worker runs an item: the
+# worker's own registry is never scraped, so its stage timings travel back
+# with the result. muted is set while warm-up prompts run, which are not
+# traffic and would add synthetic samples on every start and reload.
+_stage_capture = threading.local()
 
-print("✓ Enhanced libraries imported successfully")
+
+def observe_stage(seconds: float, stage: str, scenario: str):
+    """Record a pipeline stage latency, and keep it for the parent process when captured"""
+    if getattr(_stage_capture, 'muted', False):
+        return
+    STAGE_SECONDS.observe(seconds, stage, scenario)
+    captured = getattr(_stage_capture, 'stages', None)
+    if captured is not None:
+        captured.append((seconds, stage, scenario))
 
 
 # Cell 2: ULTIMATE FIXED Advanced NLP Entity Extraction Engine (COMPLETE VLAN FIX)
+class DUTProfile:
+    """Device under test: how many subscriber lines "all lines" covers.
+
+    DUT_PROFILE names a JSON file such as {"name": "olt-2048", "lines": 2048};
+    DUT_LINES overrides just the line count. Without either, the 16-line
+    chassis the test cases were written for is assumed.
+    """
+    __slots__ = ('name', 'line_count')
+
+    DEFAULT_LINES = 16
+
+    def __init__(self, name: str = 'default', line_count: int = DEFAULT_LINES):
+        if line_count < 1:
+            raise ValueError(f"DUT line count must be positive, got {line_count}")
+        self.name = name
+        self.line_count = line_count
+
+    @classmethod
+    def from_file(cls, path: str) -> 'DUTProfile':
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(str(data.get('name', os.path.splitext(os.path.basename(path))[0])),
+                   int(data.get('lines', cls.DEFAULT_LINES)))
+
+    @classmethod
+    def from_env(cls) -> 'DUTProfile':
+        path = os.environ.get('DUT_PROFILE')
+        profile = cls.from_file(path) if path else cls()
+        if os.environ.get('DUT_LINES'):
+            profile.line_count = int(os.environ['DUT_LINES'])
+            if profile.line_count < 1:
+                raise ValueError(f"DUT_LINES must be positive, got {profile.line_count}")
+        return profile
+
+    def all_lines(self, count: Optional[int] = None) -> List[int]:
+        """Line numbers 1..count (default: every line of the chassis)"""
+        if count is None:
+            count = self.line_count
+        elif not 1 <= count <= self.line_count:
+            raise ValueError(f"Line count must be between 1 and {self.line_count} "
+                             f"(DUT profile '{self.name}'), got {count}")
+        return list(range(1, count + 1))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'name': self.name, 'lines': self.line_count}
+
+
+DUT_PROFILE = DUTProfile.from_env()
+
+
+# Per-request bounds on extraction work: prompts longer than
+# MAX_INPUT_CHARS are rejected before preprocessing, and a scan running
+# past SCAN_DEADLINE_MS raises TimeoutError (0 disables either).
+MAX_INPUT_CHARS = int(os.environ.get('MAX_INPUT_CHARS', 100000))
+SCAN_DEADLINE_MS = float(os.environ.get('SCAN_DEADLINE_MS', 1000))
+
+
+def scan_deadline() -> Optional[float]:
+    """perf_counter() value a scan starting now must finish by, or None"""
+    return time.perf_counter() + SCAN_DEADLINE_MS / 1000 if SCAN_DEADLINE_MS > 0 else None
+
+
+def check_deadline(deadline: Optional[float]):
+    if deadline is not None and time.perf_counter() > deadline:
+        raise TimeoutError(f"Prompt scan exceeded the {SCAN_DEADLINE_MS:g} ms deadline")
+
+
+class ScanResult:
+    """Matches found by PatternScanner, keyed by the raw pattern string"""
+
+    def __init__(self, matches: Dict[str, List[Any]], families: frozenset = frozenset(),
+                 deadline: Optional[float] = None):
+        self._matches = matches
+        self.families = families  # families the keyword prefilter let through
+        self.deadline = deadline  # shared with the extractor's own regex passes
+
+    def active(self, family: str) -> bool:
+        """False when the prompt has none of the family's trigger words, so none of its patterns can match"""
+        return family in self.families
+
+    def search(self, pattern: str) -> Optional[Any]:
+        """Same result as re.search(pattern, text)"""
+        matches = self._matches[pattern]
+        return matches[0] if matches else None
+
+    def has(self, pattern: str) -> bool:
+        return bool(self._matches[pattern])
+
+    def findall(self, pattern: str) -> List[Any]:
+        """Same result as re.findall(pattern, text)"""
+        found = []
+        for match in self._matches[pattern]:
+            groups = match.groups(default='')
+            if not groups:
+                found.append(match.group(0))
+            elif len(groups) == 1:
+                found.append(groups[0])
+            else:
+                found.append(groups)
+        return found
+
+
+class SentenceIndex:
+    """Where each number sits in a lowercased prompt, built once per prompt.
+
+    Sentences are split on . ! ? and newlines. `numbers` maps every whole
+    numeric token to the sentences containing it, `pbits` maps the values of
+    "pbit N" / "pbit=N" the same way, and each sentence records which side
+    its VLAN and PBIT indicator words point to. Categorizing a value is then
+    a lookup, and "10" no longer matches inside "101".
+    """
+    __slots__ = ('numbers', 'pbits', 'vlan_sides', 'pbit_sides')
+
+    SENTENCE_RE = re.compile(r'[.!?\n]+')
+    NUMBER_RE = re.compile(r'\d+')
+    PBIT_RE = re.compile(r'pbit[ =](\d+)')
+
+    # (user-side words, network-side words); user wins when a sentence has both
+    VLAN_INDICATORS = (('user side', 'upstream', 'line', 'customer'), ('network side', 'downstream', 'uplink', 'provider'))
+    PBIT_INDICATORS = (('upstream', 'user'), ('downstream', 'network'))
+
+    def __init__(self, text: str):
+        self.numbers = {}  # value -> sentence numbers, ascending
+        self.pbits = {}
+        self.vlan_sides = []  # per sentence: 'user', 'network' or None
+        self.pbit_sides = []
+        for position, sentence in enumerate(self.SENTENCE_RE.split(text)):
+            self._add(self.numbers, self.NUMBER_RE.findall(sentence), position)
+            self._add(self.pbits, self.PBIT_RE.findall(sentence), position)
+            self.vlan_sides.append(self._side(sentence, self.VLAN_INDICATORS))
+            self.pbit_sides.append(self._side(sentence, self.PBIT_INDICATORS))
+
+    @staticmethod
+    def _add(index: Dict[int, List[int]], tokens: List[str], position: int):
+        for token in tokens:
+            positions = index.setdefault(int(token), [])
+            if not positions or positions[-1] != position:
+                positions.append(position)
+
+    @staticmethod
+    def _side(sentence: str, indicators: Tuple[Tuple[str, ...], Tuple[str, ...]]) -> Optional[str]:
+        user_words, network_words = indicators
+        if any(word in sentence for word in user_words):
+            return 'user'
+        if any(word in sentence for word in network_words):
+            return 'network'
+        return None
+
+    def vlan_side(self, vlan: int) -> Optional[str]:
+        """Side named by the first sentence that mentions the VLAN next to an indicator word"""
+        for position in self.numbers.get(vlan, ()):
+            if self.vlan_sides[position]:
+                return self.vlan_sides[position]
+        return None
+
+    def pbit_side(self, pbit: int) -> Optional[str]:
+        """Side named by the first sentence with "pbit N" next to an indicator word"""
+        for position in self.pbits.get(pbit, ()):
+            if self.pbit_sides[position]:
+                return self.pbit_sides[position]
+        return None
+
+
+def _split_alternatives(pattern: str) -> List[str]:
+    """Split a regex on its top-level '|' operators"""
+    branches, depth, start, i = [], 0, 0, 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\':
+            i += 2
+            continue
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == '|' and depth == 0:
+            branches.append(pattern[start:i])
+            start = i + 1
+        i += 1
+    branches.append(pattern[start:])
+    return branches
+
+
+def _closing_paren(pattern: str, start: int) -> int:
+    depth, i = 0, start
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\':
+            i += 2
+            continue
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+            if depth == 0:
+                return i
+        i += 1
+    raise ValueError(f"Unbalanced pattern: {pattern}")
+
+
+def _split_gaps(pattern: str) -> List[str]:
+    """Split a regex on its top-level '.*?' gaps"""
+    pieces, depth, start, i = [], 0, 0, 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\':
+            i += 2
+            continue
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif depth == 0 and pattern.startswith('.*?', i):
+            pieces.append(pattern[start:i])
+            start = i + 3
+            i += 3
+            continue
+        i += 1
+    pieces.append(pattern[start:])
+    return pieces
+
+
+class GapPattern:
+    """A regex of the form  A.*?B.*?C  matched in linear time.
+
+    re runs such patterns by backtracking: from every start it retries
+    each later occurrence of B and C, which goes quadratic on long text
+    with many partial matches. Here each piece is searched once, at its
+    earliest occurrence after the previous one, and a missing piece ends
+    the search: a later start can't find it either, since the pieces begin
+    with literals and never end earlier when they start later. The winning
+    start is then re-matched with the full regex, which succeeds on its
+    first try, so the match (and its groups) is exactly re.search()'s.
+    Text with newlines (which '.' does not cross) goes to re as is;
+    _preprocess_text folds all whitespace into spaces, so prompts never do.
+    """
+    __slots__ = ('pattern', 'regex', 'pieces')
+
+    def __init__(self, pattern: str, flags: int = 0):
+        pieces = _split_gaps(pattern)
+        if len(pieces) < 2 or len(_split_alternatives(pattern)) > 1:
+            raise ValueError(f"Not a gapped pattern: {pattern}")
+        self.pattern = pattern
+        self.regex = re.compile(pattern, flags)
+        self.pieces = [re.compile(piece, flags) for piece in pieces]
+
+    @staticmethod
+    def is_gapped(pattern: str) -> bool:
+        return len(_split_gaps(pattern)) > 1
+
+    def search(self, text: str) -> Optional[Any]:
+        """Same result as re.search(pattern, text)"""
+        if '\n' in text:
+            return self.regex.search(text)
+        head = self.pieces[0].search(text)
+        if head is None:
+            return None
+        pos = head.end()
+        for piece in self.pieces[1:]:
+            found = piece.search(text, pos)
+            if found is None:
+                return None
+            pos = found.end()
+        return self.regex.match(text, head.start())
+
+
+def _leading_words(pattern: str) -> Set[str]:
+    """Literal words a match of `pattern` can start with ('\\d' for digits)"""
+    words = set()
+    for branch in _split_alternatives(pattern):
+        if branch.startswith('('):
+            end = _closing_paren(branch, 0)
+            inner = branch[1:end]
+            if inner.startswith('?:'):
+                inner = inner[2:]
+            words |= _leading_words(inner)
+            if branch[end + 1:end + 2] in ('?', '*'):  # optional group, e.g. (?:configure\s+)?
+                words |= _leading_words(branch[end + 2:])
+        elif branch.startswith('\\d'):
+            words.add('\\d')
+        else:
+            match = re.match(r'[\w:&-]+', branch)
+            if not match:
+                raise ValueError(f"Pattern has no literal anchor: {pattern}")
+            word = match.group()
+            if branch[len(word):len(word) + 1] in ('?', '*'):  # e.g. "lines?"
+                word = word[:-1]
+            words.add('\\d' if word[0].isdigit() else word)
+    return words
+
+
+class KeywordPrefilter:
+    """Which pattern families a prompt can match at all, from its trigger words.
+
+    Every match of a family's patterns contains at least one of the
+    family's trigger words, so a prompt without any of them skips the whole
+    family. Checks are plain substring tests: on CPython they beat a
+    single-pass keyword automaton (pure Python, or a lookahead regex) by an
+    order of magnitude on long prompts. Counts how often each family is
+    skipped.
+    """
+
+    def __init__(self, triggers: Dict[str, Tuple[str, ...]]):
+        self.triggers = triggers
+        self.scans = 0
+        self.skipped = dict.fromkeys(triggers, 0)
+        self._lock = threading.Lock()
+
+    def active(self, text: str) -> frozenset:
+        active = frozenset(family for family, words in self.triggers.items() if any(word in text for word in words))
+        with self._lock:
+            self.scans += 1
+            for family in self.triggers:
+                if family not in active:
+                    self.skipped[family] += 1
+        return active
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'scans': self.scans,
+                'skipped': dict(self.skipped),
+                'skip_rate': {family: round(skipped / self.scans, 4) if self.scans else 0.0
+                              for family, skipped in self.skipped.items()},
+            }
+
+
+class PatternScanner:
+    """Find every extractor pattern match in one pass over the text.
+
+    Each pattern is indexed by the literal words it can start with. One
+    lookahead regex over all of those words walks the text once, and at
+    each hit only the patterns starting with that word are tried, as
+    anchored matches. Per pattern, matches are kept in text order without
+    overlaps, so ScanResult returns exactly what re.findall()/re.search()
+    would return for that pattern.
+
+    Families are (name, trigger words, patterns). A KeywordPrefilter drops
+    the families whose trigger words are absent before the walk, and the
+    anchor regex and dispatch table are built (once) for the patterns of
+    the remaining families only: fewer anchors, fewer match attempts.
+    Patterns with '.*?' gaps are not anchored; they run as GapPatterns
+    after the walk and record only their first match (enough for search()
+    and has()). The walk checks the scan deadline every 256 anchors.
+
+    Text must already be lowercase (as _preprocess_text returns it); that
+    keeps IGNORECASE, which is several times slower, out of the scan.
+    """
+
+    def __init__(self, families: List[Tuple[str, Tuple[str, ...], List[str]]]):
+        self.families = families
+        self.prefilter = KeywordPrefilter({name: triggers for name, triggers, _ in families})
+        self.patterns = {}
+        self.gapped = {}
+        for _, _, patterns in families:
+            for pattern in patterns:
+                if pattern in self.patterns or pattern in self.gapped:
+                    continue
+                if GapPattern.is_gapped(pattern):
+                    self.gapped[pattern] = GapPattern(pattern)
+                else:
+                    self.patterns[pattern] = re.compile(pattern)
+        self._plans = {}  # active families -> (anchor regex, dispatch table, gapped patterns)
+
+    def _ordered(self, patterns: List[str]) -> List[Tuple[str, Any]]:
+        unique = set(patterns)
+        return [(pattern, regex) for pattern, regex in self.patterns.items() if pattern in unique]
+
+    def _plan(self, families: frozenset) -> Tuple[Optional[Any], Dict[str, List[Tuple[str, Any]]], List[GapPattern]]:
+        """Anchor regex, dispatch table and gapped patterns for the given families"""
+        plan = self._plans.get(families)
+        if plan is not None:
+            return plan
+        
+        starts, gapped = {}, {}
+        for name, _, patterns in self.families:
+            if name in families:
+                for pattern in patterns:
+                    if pattern in self.gapped:
+                        gapped[pattern] = self.gapped[pattern]
+                        continue
+                    for word in _leading_words(pattern):
+                        if pattern not in starts.get(word, ()):
+                            starts.setdefault(word, []).append(pattern)
+        
+        # Longest word first, so the hit at a position is the longest anchor;
+        # patterns starting with any shorter prefix of it are tried there too
+        words = sorted(starts, key=len, reverse=True)
+        dispatch = {}
+        for word in words:
+            if word == '\\d':
+                continue
+            candidates = [pattern for prefix, patterns in starts.items()
+                          if prefix != '\\d' and word.startswith(prefix) for pattern in patterns]
+            dispatch[word] = self._ordered(candidates)
+        if '\\d' in starts:
+            for digit in '0123456789':
+                dispatch[digit] = self._ordered(starts['\\d'])
+        
+        alternatives = '|'.join('\\d' if word == '\\d' else re.escape(word) for word in words)
+        plan = (re.compile(f'(?=({alternatives}))') if words else None, dispatch, list(gapped.values()))
+        self._plans[families] = plan
+        return plan
+
+    def scan(self, text: str) -> ScanResult:
+        deadline = scan_deadline()
+        families = self.prefilter.active(text)
+        anchor_regex, dispatch, gapped = self._plan(families)
+        matches = {pattern: [] for pattern in itertools.chain(self.patterns, self.gapped)}
+        
+        if anchor_regex is not None:
+            next_start = dict.fromkeys(self.patterns, 0)
+            countdown = 256
+            for anchor in anchor_regex.finditer(text):
+                countdown -= 1
+                if not countdown:
+                    check_deadline(deadline)
+                    countdown = 256
+                pos = anchor.start()
+                for pattern, regex in dispatch[anchor.group(1)]:
+                    if pos < next_start[pattern]:
+                        continue  # inside the previous match, like re.findall
+                    match = regex.match(text, pos)
+                    if match:
+                        matches[pattern].append(match)
+                        next_start[pattern] = max(match.end(), pos + 1)
+        
+        for gap in gapped:
+            check_deadline(deadline)
+            match = gap.search(text)
+            if match:
+                matches[gap.pattern].append(match)
+        
+        return ScanResult(matches, families, deadline)
+
+
+class EntityCache:
+    """Bounded LRU cache of extracted entities with a per-entry TTL.
+
+    Keys are normalized prompts (the output of _preprocess_text), so
+    prompts differing only in case, spacing or punctuation share an entry.
+    Entries are deep-copied on the way in and out: callers own what they
+    get back and can't corrupt the cached copy.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600.0):
+        self.maxsize = maxsize  # 0 disables caching
+        self.ttl = ttl  # seconds; 0 means entries never expire
+        self._entries = OrderedDict()  # key -> (expires_at, entities)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, entities = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return copy.deepcopy(entities)
+
+    def put(self, key: str, entities: Dict[str, Any]):
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl > 0 else None
+        entities = copy.deepcopy(entities)
+        with self._lock:
+            self._entries[key] = (expires_at, entities)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
+
+
 class AdvancedNLPEntityExtractor:
-    def __init__(self):
-        self.spacy_available = SPACY_AVAILABLE
-        if self.spacy_available:
-            self.nlp = nlp
-            self.matcher = Matcher(self.nlp.vocab)
-            self._setup_spacy_patterns()
+    # Spelled-out line counts captured by all_lines_patterns
+    LINE_COUNT_WORDS = {'sixteen': 16}
+
+    def __init__(self, engine: str = EXTRACTION_ENGINE, profile: Optional[DUTProfile] = None):
+        if engine not in EXTRACTION_ENGINES:
+            raise ValueError(f"engine must be one of {', '.join(EXTRACTION_ENGINES)}, got {engine!r}")
+        self.engine = engine
+        self.profile = profile or DUT_PROFILE
+        
+        # spaCy Matcher is built on first use (SPACY_MODE=lazy) or at the end
+        # of __init__ (eager), once the patterns it mirrors exist
+        self._matcher = None
+        self._mention_rules = []
         
         # Enhanced VLAN patterns - FIXED for explicit user/network VLAN detection
         self.vlan_patterns = [
@@ -147,12 +978,12 @@ class AdvancedNLPEntityExtractor:
         
         # All lines detection patterns
         self.all_lines_patterns = [
-            r'all\s+16\s+lines',  # "all 16 lines"
+            r'all\s+(\d+)\s+lines',  # "all 16 lines" (explicit count)
             r'all\s+lines',  # "all lines"
             r'all\s+(?:the\s+)?lines',  # "all the lines"
             r'every\s+line',  # "every line"
             r'for\s+all\s+lines',  # "for all lines"
-            r'(?:all\s+)?sixteen\s+lines',  # "sixteen lines"
+            r'(?:all\s+)?(sixteen)\s+lines',  # "sixteen lines" (explicit count)
         ]
         
         self.pbit_patterns = [
@@ -199,31 +1030,142 @@ class AdvancedNLPEntityExtractor:
         self.discretization_patterns = [
             r'(?:first|initial)\s+(\d+)\s+lines?.*?(1:1|n:1).*?(?:remaining|rest|next|last).*?lines?.*?(1:1|n:1)',
             r'(\d+)\s+lines?.*?(1:1|n:1).*?(?:remaining|rest|next|last).*?lines?.*?(1:1|n:1)',
-            r'(1:1|n:1)\s+forwarder.*?(?:first|initial)\s+(\d+)\s+lines?.*?(?:and|,).*?(1:1|n:1)\s+forwarder.*?(?:remaining|rest)',
+            r'(1:1|n:1)\s+forwarder.*?(?:first|initial)\s+(\d+)\s+lines?.*?(?:and|,).*?(1:1|n:1)\s+forwarder.*?(?:remaining|rest)(?:\s+(\d+)\s+lines?)?',
+        ]
+        
+        # Lazy '.*?' chains backtrack badly on long text: run them in linear time
+        self.discretization_matchers = [GapPattern(pattern, re.IGNORECASE) for pattern in self.discretization_patterns]
+        
+        # Explicit user/network VLAN statements, most specific first
+        self.explicit_vlan_patterns = [
+            r'user\s+vlan\s+(\d+)\s*&\s*network\s+service\s+on\s+vlan\s+(\d+)',  # user VLAN 601 & network service on VLAN 601
+            r'user\s*&\s*network\s+service\s+on\s+vlan\s+(\d+)',  # user & network service on VLAN 601
+            r'network\s+service\s+on\s+vlan\s+(\d+)',  # network service on VLAN 601
+            r'user\s+vlan\s+(\d+)',  # user VLAN 601
         ]
+        
+        # Single-pass scanner over every mention pattern, grouped by entity
+        # family with the trigger words any match of the family contains
+        self.scanner = PatternScanner([
+            ('explicit', ('user', 'network'), self.explicit_vlan_patterns + [r'user', r'network']),
+            ('translation', ('translation',), self.vlan_translation_patterns[:2]),
+            ('service', ('service',), [pattern_info['pattern'] for pattern_info in self.service_count_patterns]),
+            ('line', ('line',), self.all_lines_patterns + self.line_patterns +
+             [r'line\s+(\d+)\s+and\s+line\s+(\d+)', r'line\s+(\d+)', r'any\s+(\d+)\s+lines?']),
+            ('vlan', ('vlan', 'identifier', 'tag'), self.vlan_patterns),
+            ('pbit', ('pbit', 'p-bit', 'priority'), self.pbit_patterns),
+            ('forwarder', (':', 'dedicated', 'individual', 'separate'),
+             [r'1\s*:\s*1', r'n\s*:\s*1', r'dedicated', r'individual', r'separate']),
+            ('protocol', ('v6', 'ppp', 'internet'), self.protocol_patterns),
+            ('untagged', ('untagged', 'valn', 'no'), self.untagged_patterns),
+            # Gate only: discretization_patterns run with re.search, not in the scan
+            ('discretization', ('remaining', 'rest', 'next', 'last'), []),
+        ])
+        
+        # Extracted entities per normalized prompt
+        self.entity_cache = EntityCache(
+            maxsize=int(os.environ.get('ENTITY_CACHE_SIZE', 1024)),
+            ttl=float(os.environ.get('ENTITY_CACHE_TTL', 3600)),
+        )
+        
+        if SPACY_MODE == 'eager' and engine != 'regex':
+            self._ensure_spacy()
 
-    def _setup_spacy_patterns(self):
-        """Setup spaCy patterns for entity recognition"""
-        if not self.spacy_available:
-            return
+    def _ensure_spacy(self) -> bool:
+        """Load spaCy and build the Matcher if enabled; False when unavailable.
+
+        The Matcher is filled in a local and published under _spacy_lock
+        only once every pattern is added, so a concurrent request never
+        sees (and caches the result of) a half-built Matcher.
+        """
+        if self._matcher is not None:
+            return True
+        model = load_spacy()  # takes _spacy_lock itself
+        if model is None:
+            return False
+        with _spacy_lock:
+            if self._matcher is None:
+                from spacy.matcher import Matcher
+                matcher = Matcher(model.vocab)
+                self._mention_rules = self._setup_spacy_patterns(matcher)
+                self._matcher = matcher
+        return True
+
+    @property
+    def spacy_available(self) -> bool:
+        return self._ensure_spacy()
+
+    @property
+    def uses_matcher(self) -> bool:
+        """True when VLAN/line/PBIT mentions come from the spaCy Matcher"""
+        return self.engine != 'regex' and self.spacy_available
+
+    @property
+    def effective_engine(self) -> str:
+        return 'matcher' if self.uses_matcher else 'regex'
+
+    @property
+    def nlp(self):
+        return nlp if self._ensure_spacy() else None
+
+    @property
+    def matcher(self):
+        return self._matcher if self._ensure_spacy() else None
+
+    def _setup_spacy_patterns(self, matcher) -> List[Tuple[int, str, re.Pattern]]:
+        """Add the entity patterns to matcher; returns the mention rules.
+
+        VLAN/line/PBIT mentions get one Matcher rule per regex in
+        vlan_patterns/line_patterns/pbit_patterns, so both engines find the
+        same numbers in the same order. A keyword may end a longer token
+        (the regex matches "online 5" too), SPACY stands in for the
+        regex's whitespace, and the matched span is read back with the
+        regex itself.
+        """
+        def ends(word: str, space: bool = True) -> Dict[str, Any]:
+            return {"LOWER": {"REGEX": re.escape(word) + "$"}, "SPACY": space}
+        
+        def word(text: str, space: bool = True) -> Dict[str, Any]:
+            return {"LOWER": text, "SPACY": space}
+        
+        number = {"LOWER": {"REGEX": r"^\d"}}
+        hyphen = {"ORTH": "-", "SPACY": False}
+        
+        # (regex, token patterns) per mention regex, in regex order. The
+        # English tokenizer splits "id" like "i'd" and hyphenated words.
+        vlan_rules = [
+            (self.vlan_patterns[0], [[ends("user"), word("vlan"), number]]),
+            (self.vlan_patterns[1], [[ends("network"), word("vlan"), number],
+                                     [ends("network"), word("service"), word("on"), word("vlan"), number]]),
+            (self.vlan_patterns[2], [[ends("user"), word("&"), word("network"), word("service"), word("on"),
+                                      word("vlan"), number]]),
+            (self.vlan_patterns[3], [[ends("vlan"), word("id"), number],
+                                     [ends("vlan"), word("i", False), word("d"), number]]),
+            (self.vlan_patterns[4], [[ends("vlan", False), hyphen, word("tag"), number]]),
+            (self.vlan_patterns[5], [[ends("vlan"), word("identifier"), number]]),
+            (self.vlan_patterns[6], [[ends("vlan"), word("tag"), number]]),
+            (self.vlan_patterns[7], [[ends("vlan"), number]]),
+            (self.vlan_patterns[8], [[ends("identifier"), number]]),
+            (self.vlan_patterns[9], [[ends("tag"), number]]),
+        ]
         
-        # Enhanced spaCy patterns
-        vlan_patterns = [
-            [{"LOWER": "vlan"}, {"IS_DIGIT": True}],
-            [{"LOWER": "vlan"}, {"LOWER": "id"}, {"IS_DIGIT": True}],
-            [{"LOWER": "vlan"}, {"LOWER": "identifier"}, {"IS_DIGIT": True}],
-            [{"LOWER": "vlan"}, {"LOWER": "tag"}, {"IS_DIGIT": True}],
-            [{"LOWER": "vlan-tag"}, {"IS_DIGIT": True}],
-            [{"LOWER": "identifier"}, {"IS_DIGIT": True}],
-            [{"LOWER": "tag"}, {"IS_DIGIT": True}],
+        # Lines are collected as a set and the "for/on/per line" patterns only
+        # match inside these two, so they need no rules of their own
+        line_rules = [
+            (self.line_patterns[0], [[ends("line"), word("number"), number],
+                                     [ends("line"), {"LOWER": {"REGEX": r"^number\d"}}],
+                                     [ends("linenumber"), number],
+                                     [{"LOWER": {"REGEX": r"linenumber\d"}}]]),
+            (self.line_patterns[2], [[ends("line"), number],
+                                     [{"LOWER": {"REGEX": r"line\d"}}]]),  # "line4"
         ]
         
-        line_patterns = [
-            [{"LOWER": "line"}, {"IS_DIGIT": True}],
-            [{"LOWER": "line"}, {"LOWER": "number"}, {"IS_DIGIT": True}],
-            [{"LOWER": "on"}, {"LOWER": "line"}, {"IS_DIGIT": True}],
-            [{"LOWER": "for"}, {"LOWER": "line"}, {"IS_DIGIT": True}],
-            [{"LOWER": "per"}, {"LOWER": "line"}, {"IS_DIGIT": True}],
+        # "all pbit" and "different pbit" carry no number
+        pbit_rules = [
+            (self.pbit_patterns[0], [[ends("pbit"), number]]),
+            (self.pbit_patterns[1], [[ends("p", False), hyphen, word("bit"), number]]),
+            (self.pbit_patterns[2], [[ends("priority"), number],
+                                     [ends("priority"), word("bit"), number]]),
         ]
         
         service_patterns = [
@@ -231,22 +1173,71 @@ class AdvancedNLPEntityExtractor:
             [{"IS_DIGIT": True}, {"LOWER": "service"}, {"LOWER": "per"}, {"LOWER": "line"}, {"IS_DIGIT": True}],
         ]
         
-        pbit_patterns = [
-            [{"LOWER": "pbit"}, {"IS_DIGIT": True}],
-            [{"LOWER": "p-bit"}, {"IS_DIGIT": True}],
-            [{"LOWER": "priority"}, {"LOWER": "bit"}, {"IS_DIGIT": True}],
-            [{"LOWER": "all"}, {"LOWER": "pbit"}],
-        ]
-        
-        # Add patterns to matcher
-        self.matcher.add("VLAN", vlan_patterns)
-        self.matcher.add("LINE", line_patterns)
-        self.matcher.add("SERVICE", service_patterns)
-        self.matcher.add("PBIT", pbit_patterns)
+        mention_rules = []
+        for label, rules in (("VLAN", vlan_rules), ("LINE", line_rules), ("PBIT", pbit_rules)):
+            for position, (pattern, token_patterns) in enumerate(rules):
+                key = f"{label}_{position}"
+                matcher.add(key, token_patterns)
+                mention_rules.append((matcher.vocab.strings[key], label, re.compile(pattern)))
+        matcher.add("SERVICE", service_patterns)
+        return mention_rules
+
+    def _spacy_mentions(self, doc) -> Dict[str, List[int]]:
+        """VLAN/line/PBIT numbers found by the Matcher, in the regex engine's order.
+
+        Rules are read in pattern order. Overlapping spans of a rule ("pbit
+        5.pbit 7": the number token also ends in the keyword) are merged,
+        and the rule's regex runs over each merged region.
+        """
+        spans = {}
+        for match_id, start, end in self.matcher(doc):
+            spans.setdefault(match_id, []).append((start, end))
+        
+        mentions = {'VLAN': [], 'LINE': [], 'PBIT': []}
+        for match_id, label, regex in self._mention_rules:
+            regions = []
+            for start, end in sorted(spans.get(match_id, ())):
+                if regions and start < regions[-1][1]:
+                    regions[-1][1] = max(regions[-1][1], end)
+                else:
+                    regions.append([start, end])
+            for start, end in regions:
+                mentions[label].extend(int(n) for n in regex.findall(doc[start:end].text.lower()) if n.isdigit())
+        return mentions
 
-    def extract_comprehensive_entities(self, text: str) -> Dict[str, Any]:
-        """Extract all entities with enhanced logic"""
+    def extract_comprehensive_entities(self, text: str, use_cache: bool = True) -> Dict[str, Any]:
+        """Extract all entities with enhanced logic (use_cache=False always re-extracts)"""
         text_clean = self._preprocess_text(text)
+        cached = self.entity_cache.get(text_clean) if use_cache else None
+        if cached is not None:
+            return cached
+        
+        doc = self.nlp(text_clean) if self.uses_matcher else None
+        return self._extract_entities(text_clean, doc)
+
+    def extract_entities_batch(self, texts: List[str], batch_size: int = SPACY_BATCH_SIZE,
+                               n_process: int = SPACY_N_PROCESS) -> List[Dict[str, Any]]:
+        """Extract entities for many prompts, tokenizing cache misses with nlp.pipe"""
+        cleaned = [self._preprocess_text(text) for text in texts]
+        results = [self.entity_cache.get(text_clean) for text_clean in cleaned]
+        missing = [i for i, entities in enumerate(results) if entities is None]
+        
+        if self.uses_matcher:
+            docs = self.nlp.pipe((cleaned[i] for i in missing), batch_size=batch_size, n_process=n_process)
+        else:
+            docs = itertools.repeat(None)
+        
+        for i, doc in zip(missing, docs):
+            results[i] = self._extract_entities(cleaned[i], doc)
+        return results
+
+    def _extract_entities(self, text_clean: str, doc=None) -> Dict[str, Any]:
+        """Build, post-process and cache the entities for one preprocessed prompt.
+
+        With a spaCy Doc the VLAN/line/PBIT mentions come from the Matcher;
+        phrase-level rules (services, discretization, forwarders, protocols,
+        untagged) always use the shared pattern scanner.
+        """
         entities = {
             'user_vlans': [],
             'network_vlans': [],
@@ -281,46 +1272,57 @@ class AdvancedNLPEntityExtractor:
         }
         
         # Enhanced entity extraction
-        self._extract_with_comprehensive_regex(text_clean, entities)
+        mentions = self._spacy_mentions(doc) if doc is not None else None
+        self._extract_with_comprehensive_regex(text_clean, entities, mentions)
         
         # Post-process and validate
         self._post_process_entities(entities)
+        self.entity_cache.put(text_clean, entities)
         return entities
 
-    def _extract_with_comprehensive_regex(self, text: str, entities: Dict):
+    def _extract_with_comprehensive_regex(self, text: str, entities: Dict, mentions: Optional[Dict[str, List[int]]] = None):
         """Enhanced comprehensive regex extraction with CASE INSENSITIVE matching"""
         text_lower = text.lower()
         
+        # Find every VLAN/line/PBIT/forwarder/protocol/untagged mention in one pass
+        scan = self.scanner.scan(text_lower)
+        
         # CRITICAL FIX: Check for explicit user and network VLAN mentions
-        self._extract_explicit_user_network_vlans(text_lower, entities)
+        self._extract_explicit_user_network_vlans(text_lower, entities, scan)
         
         # CRITICAL FIX: Check for VLAN translation FIRST (before untagged detection)
-        if re.search(r'with\s+vlan\s+translation', text_lower, re.IGNORECASE):
+        if scan.has(r'with\s+vlan\s+translation'):
             entities['has_vlan_translation'] = True
-        elif re.search(r'without\s+vlan\s+translation', text_lower, re.IGNORECASE):
+        elif scan.has(r'without\s+vlan\s+translation'):
             entities['has_vlan_translation'] = False
             # CRITICAL: "without VLAN translation" does NOT mean untagged!
             # It means same VLANs on both sides (transparent)
         
         # Enhanced service count detection
-        service_detected = self._extract_service_patterns_fixed(text_lower, entities)
+        service_detected = self._extract_service_patterns_fixed(text_lower, entities, scan)
         if service_detected:
             return
         
         # Check for discretization patterns
-        discretization_found = self._extract_discretization_regex(text_lower, entities)
+        discretization_found = self._extract_discretization_regex(text_lower, entities, scan)
         if discretization_found:
             return
         
         # Enhanced multiple line detection
-        self._extract_multiple_lines(text_lower, entities)
+        self._extract_multiple_lines(text_lower, entities, scan, mentions)
+        
+        # Number positions and sentence context, shared by VLAN and PBIT categorization
+        index = SentenceIndex(text_lower)
         
         # Extract VLANs - ONLY if not already explicitly extracted
         if not entities['user_vlans'] and not entities['network_vlans']:
-            all_vlans = []
-            for pattern in self.vlan_patterns:
-                matches = re.findall(pattern, text_lower, re.IGNORECASE)
-                all_vlans.extend([int(v) for v in matches if v.isdigit()])
+            if mentions is not None:
+                all_vlans = list(mentions['VLAN'])
+            else:
+                all_vlans = []
+                for pattern in self.vlan_patterns:
+                    matches = scan.findall(pattern)
+                    all_vlans.extend([int(v) for v in matches if v.isdigit()])
             
             # Remove duplicates while preserving order
             seen = set()
@@ -330,24 +1332,25 @@ class AdvancedNLPEntityExtractor:
                     unique_vlans.append(vlan)
                     seen.add(vlan)
             
-            self._categorize_vlans_by_context_fixed(text, unique_vlans, entities)
+            self._categorize_vlans_by_context_fixed(index, unique_vlans, entities)
         
         # Enhanced PBIT detection
-        self._extract_enhanced_pbits(text_lower, entities)
+        self._extract_enhanced_pbits(index, entities, scan, mentions)
         
         # Extract other entities
-        self._extract_forwarders_regex(text, entities)
-        self._extract_protocols_regex(text, entities)
+        self._extract_forwarders_regex(text, entities, scan)
+        self._extract_protocols_regex(text, entities, scan)
         
         # CRITICAL FIX: Only detect untagged if no VLAN translation context AND case insensitive
         if entities['has_vlan_translation'] is None:
-            self._detect_untagged_regex(text, entities)
+            self._detect_untagged_regex(text, entities, scan)
 
-    def _extract_explicit_user_network_vlans(self, text: str, entities: Dict):
+    def _extract_explicit_user_network_vlans(self, text: str, entities: Dict, scan: ScanResult):
         """CRITICAL FIX: Extract explicit user and network VLAN mentions"""
+        pattern1, pattern2, pattern3, pattern4 = self.explicit_vlan_patterns
+        
         # Pattern 1: "user VLAN 601 & network service on VLAN 601"
-        pattern1 = r'user\s+vlan\s+(\d+)\s*&\s*network\s+service\s+on\s+vlan\s+(\d+)'
-        match1 = re.search(pattern1, text, re.IGNORECASE)
+        match1 = scan.search(pattern1)
         if match1:
             user_vlan = int(match1.group(1))
             network_vlan = int(match1.group(2))
@@ -356,48 +1359,45 @@ class AdvancedNLPEntityExtractor:
             entities['both_user_network_mentioned'] = True
             if user_vlan == network_vlan:
                 entities['explicit_user_network_same_vlan'] = True
-            print(f"✓ Explicit user VLAN {user_vlan} & network VLAN {network_vlan}")
+            log.debug("✓ Explicit user VLAN %s & network VLAN %s", user_vlan, network_vlan)
             return
         
         # Pattern 2: "user & network service on VLAN 601"
-        pattern2 = r'user\s*&\s*network\s+service\s+on\s+vlan\s+(\d+)'
-        match2 = re.search(pattern2, text, re.IGNORECASE)
+        match2 = scan.search(pattern2)
         if match2:
             vlan = int(match2.group(1))
             entities['user_vlans'] = [vlan]
             entities['network_vlans'] = [vlan]
             entities['both_user_network_mentioned'] = True
             entities['explicit_user_network_same_vlan'] = True
-            print(f"✓ Explicit user & network service on VLAN {vlan}")
+            log.debug("✓ Explicit user & network service on VLAN %s", vlan)
             return
         
         # Pattern 3: "network service on VLAN 601" (without user mention)
-        pattern3 = r'network\s+service\s+on\s+vlan\s+(\d+)'
-        match3 = re.search(pattern3, text, re.IGNORECASE)
-        if match3 and not re.search(r'user', text, re.IGNORECASE):
+        match3 = scan.search(pattern3)
+        if match3 and not scan.has(r'user'):
             vlan = int(match3.group(1))
             entities['network_vlans'] = [vlan]
-            print(f"✓ Explicit network service on VLAN {vlan}")
+            log.debug("✓ Explicit network service on VLAN %s", vlan)
             return
         
         # Pattern 4: "user VLAN 601" (without network mention)
-        pattern4 = r'user\s+vlan\s+(\d+)'
-        match4 = re.search(pattern4, text, re.IGNORECASE)
-        if match4 and not re.search(r'network', text, re.IGNORECASE):
+        match4 = scan.search(pattern4)
+        if match4 and not scan.has(r'network'):
             vlan = int(match4.group(1))
             entities['user_vlans'] = [vlan]
-            print(f"✓ Explicit user VLAN {vlan}")
+            log.debug("✓ Explicit user VLAN %s", vlan)
             return
 
-    def _extract_service_patterns_fixed(self, text: str, entities: Dict) -> bool:
+    def _extract_service_patterns_fixed(self, text: str, entities: Dict, scan: ScanResult) -> bool:
         """FIXED: Extract service patterns with proper group handling"""
         for pattern_info in self.service_count_patterns:
             pattern = pattern_info['pattern']
             groups = pattern_info['groups']
-            matches = re.findall(pattern, text, re.IGNORECASE)
+            matches = scan.findall(pattern)
             
             if matches:
-                print(f"🔍 Service pattern found: {pattern} -> {matches}")
+                log.debug("🔍 Service pattern found: %s -> %s", pattern, matches)
                 for match in matches:
                     if isinstance(match, str):
                         match = (match,)
@@ -430,7 +1430,7 @@ class AdvancedNLPEntityExtractor:
                         lines.append(int(parsed_data['line_num2']))
                     
                     # CRITICAL FIX: Check for "different pbit" in multi-service - CASE INSENSITIVE
-                    if re.search(r'different\s+pbit', text, re.IGNORECASE):
+                    if scan.has(r'different\s+pbit'):
                         entities['different_pbit_per_service'] = True
                     
                     # Update entities
@@ -443,38 +1443,42 @@ class AdvancedNLPEntityExtractor:
                     for line_num in lines:
                         entities['services_per_line'][line_num] = service_count
                     
-                    print(f"✓ Parsed - Count: {service_count}, Type: {service_type}, Lines: {lines}")
+                    log.debug("✓ Parsed - Count: %s, Type: %s, Lines: %s", service_count, service_type, lines)
                     return True
         
         return False
 
-    def _extract_multiple_lines(self, text: str, entities: Dict):
+    def _extract_multiple_lines(self, text: str, entities: Dict, scan: ScanResult, mentions: Optional[Dict[str, List[int]]] = None):
         """FIXED: Enhanced multiple line detection"""
         # Check for "all lines" patterns first
         for pattern in self.all_lines_patterns:
-            if re.search(pattern, text, re.IGNORECASE):
-                entities['lines'] = list(range(1, 17))
-                entities['is_all_lines'] = True
-                entities['is_multi_line'] = True
+            match = scan.search(pattern)
+            if match:
+                count = match.group(1) if match.groups() else None
+                if count is not None:
+                    count = int(count) if count.isdigit() else self.LINE_COUNT_WORDS[count]
+                entities['lines'] = self.profile.all_lines(count)
+                entities['is_all_lines'] = len(entities['lines']) == self.profile.line_count
+                entities['is_multi_line'] = len(entities['lines']) > 1
                 return
         
         # Check for specific multiple line patterns
         lines_found = set()
         
         # "line 1 and line 2"
-        match = re.search(r'line\s+(\d+)\s+and\s+line\s+(\d+)', text, re.IGNORECASE)
+        match = scan.search(r'line\s+(\d+)\s+and\s+line\s+(\d+)')
         if match:
             line1, line2 = int(match.group(1)), int(match.group(2))
             lines_found.update([line1, line2])
         
         # "line 4, line 8, line 12 and line 16"
-        matches = re.findall(r'line\s+(\d+)', text, re.IGNORECASE)
+        matches = scan.findall(r'line\s+(\d+)')
         if len(matches) > 1:
             lines_found.update([int(l) for l in matches])
         
         # CRITICAL FIX: "any 2 lines" - use special flag and default lines
-        if re.search(r'any\s+(\d+)\s+lines?', text, re.IGNORECASE):
-            match = re.search(r'any\s+(\d+)\s+lines?', text, re.IGNORECASE)
+        if scan.has(r'any\s+(\d+)\s+lines?'):
+            match = scan.search(r'any\s+(\d+)\s+lines?')
             count = int(match.group(1))
             if count == 2:
                 lines_found.update([5, 13])  # Default for "any 2 lines"
@@ -489,9 +1493,12 @@ class AdvancedNLPEntityExtractor:
         
         # Fall back to single line patterns
         if not lines_found:
-            for pattern in self.line_patterns:
-                matches = re.findall(pattern, text, re.IGNORECASE)
-                lines_found.update([int(l) for l in matches if l.isdigit()])
+            if mentions is not None:
+                lines_found.update(mentions['LINE'])
+            else:
+                for pattern in self.line_patterns:
+                    matches = scan.findall(pattern)
+                    lines_found.update([int(l) for l in matches if l.isdigit()])
         
         # Default to line 1 if nothing found
         if not lines_found:
@@ -500,81 +1507,77 @@ class AdvancedNLPEntityExtractor:
         entities['lines'] = sorted(list(lines_found))
         entities['is_multi_line'] = len(lines_found) > 1
 
-    def _extract_enhanced_pbits(self, text: str, entities: Dict):
+    def _extract_enhanced_pbits(self, index: SentenceIndex, entities: Dict, scan: ScanResult, mentions: Optional[Dict[str, List[int]]] = None):
         """FIXED: Enhanced PBIT extraction with range support - CASE INSENSITIVE"""
         # Check for "all pbit"
-        if re.search(r'all\s+pbit', text, re.IGNORECASE):
+        if scan.has(r'all\s+pbit'):
             entities['all_pbit_range'] = True
             entities['user_pbits'] = list(range(8))  # 0-7
             entities['network_pbits'] = list(range(8))
             return
         
         # CRITICAL FIX: Check for "different pbit" - CASE INSENSITIVE
-        if re.search(r'different\s+pbit', text, re.IGNORECASE):
+        if scan.has(r'different\s+pbit'):
             entities['different_pbit_per_service'] = True
             return
         
         # Regular PBIT extraction
-        all_pbits = []
-        for pattern in self.pbit_patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            all_pbits.extend([int(p) for p in matches if p.isdigit()])
+        if mentions is not None:
+            all_pbits = list(mentions['PBIT'])
+        else:
+            all_pbits = []
+            for pattern in self.pbit_patterns:
+                matches = scan.findall(pattern)
+                all_pbits.extend([int(p) for p in matches if p.isdigit()])
         
-        self._categorize_pbits_by_context_fixed(text, all_pbits, entities)
+        self._categorize_pbits_by_context_fixed(index, all_pbits, entities)
 
-    def _extract_discretization_regex(self, text: str, entities: Dict) -> bool:
+    def _extract_discretization_regex(self, text: str, entities: Dict, scan: ScanResult) -> bool:
         """Enhanced discretization extraction"""
+        if not scan.active('discretization'):
+            return False
         text_lower = text.lower()
         
-        for pattern in self.discretization_patterns:
-            match = re.search(pattern, text_lower, re.IGNORECASE)
+        for matcher in self.discretization_matchers:
+            check_deadline(scan.deadline)
+            match = matcher.search(text_lower)
             if match:
                 groups = match.groups()
-                if len(groups) == 3 and groups[0] in ['1:1', 'n:1']:
+                if len(groups) == 4 and groups[0] in ['1:1', 'n:1']:
                     first_type = groups[0].upper()
                     first_count = int(groups[1])
                     remaining_type = groups[2].upper()
+                    # "remaining 8 lines" stops there; "remaining lines" runs to the last line
+                    lines = self.profile.all_lines(first_count + int(groups[3]) if groups[3] else None)
                     
-                    for line in range(1, first_count + 1):
+                    for line in self.profile.all_lines(first_count):
                         entities['line_forwarder_map'][line] = first_type
-                    for line in range(first_count + 1, 17):
+                    for line in lines[first_count:]:
                         entities['line_forwarder_map'][line] = remaining_type
                     
-                    entities['lines'] = list(range(1, 17))
-                    entities['is_all_lines'] = True
+                    entities['lines'] = lines
+                    entities['is_all_lines'] = len(lines) == self.profile.line_count
                     entities['is_multi_line'] = True
                     entities['mixed_forwarders'] = True
                     return True
         
         return False
 
-    def _categorize_vlans_by_context_fixed(self, text: str, vlans: List[int], entities: Dict):
+    def _categorize_vlans_by_context_fixed(self, index: SentenceIndex, vlans: List[int], entities: Dict):
         """FIXED: Enhanced VLAN categorization with explicit user/network support"""
         if not vlans:
             return
         
-        text_lower = text.lower()
-        sentences = re.split(r'[.!?\n]+', text_lower)
-        
         user_vlans = []
         network_vlans = []
         
         for vlan in vlans:
-            vlan_str = str(vlan)
-            assigned = False
-            
-            for sentence in sentences:
-                if vlan_str in sentence:
-                    if any(indicator in sentence for indicator in ['user side', 'upstream', 'line', 'customer']):
-                        user_vlans.append(vlan)
-                        assigned = True
-                        break
-                    elif any(indicator in sentence for indicator in ['network side', 'downstream', 'uplink', 'provider']):
-                        network_vlans.append(vlan)
-                        assigned = True
-                        break
-            
-            if not assigned:
+            side = index.vlan_side(vlan)
+            if side == 'user':
+                user_vlans.append(vlan)
+            elif side == 'network':
+                network_vlans.append(vlan)
+            else:
                 # CRITICAL FIX: For 1:1 services, assign to both sides unless explicitly different
                 if entities.get('forwarder_type') == '1:1' and not entities.get('has_vlan_translation'):
                     user_vlans.append(vlan)
@@ -588,33 +1591,21 @@ class AdvancedNLPEntityExtractor:
         entities['user_vlans'] = sorted(list(set(user_vlans)))
         entities['network_vlans'] = sorted(list(set(network_vlans)))
 
-    def _categorize_pbits_by_context_fixed(self, text: str, pbits: List[int], entities: Dict):
+    def _categorize_pbits_by_context_fixed(self, index: SentenceIndex, pbits: List[int], entities: Dict):
         """Enhanced PBIT categorization"""
         if not pbits:
             return
         
-        text_lower = text.lower()
-        sentences = re.split(r'[.!?\n]+', text_lower)
-        
         user_pbits = []
         network_pbits = []
         
         for i, pbit in enumerate(pbits):
-            pbit_str = str(pbit)
-            assigned = False
-            
-            for sentence in sentences:
-                if f'pbit {pbit_str}' in sentence or f'pbit={pbit_str}' in sentence:
-                    if any(word in sentence for word in ['upstream', 'user', 'send upstream']):
-                        user_pbits.append(pbit)
-                        assigned = True
-                        break
-                    elif any(word in sentence for word in ['downstream', 'network', 'send downstream']):
-                        network_pbits.append(pbit)
-                        assigned = True
-                        break
-            
-            if not assigned:
+            side = index.pbit_side(pbit)
+            if side == 'user':
+                user_pbits.append(pbit)
+            elif side == 'network':
+                network_pbits.append(pbit)
+            else:
                 if i % 2 == 0:
                     user_pbits.append(pbit)
                 else:
@@ -623,57 +1614,57 @@ class AdvancedNLPEntityExtractor:
         entities['user_pbits'] = sorted(list(set(user_pbits)))
         entities['network_pbits'] = sorted(list(set(network_pbits)))
 
-    def _extract_forwarders_regex(self, text: str, entities: Dict):
+    def _extract_forwarders_regex(self, text: str, entities: Dict, scan: ScanResult):
         """Extract forwarder type using regex - CASE INSENSITIVE"""
-        text_lower = text.lower()
-        
-        one_to_one_count = len(re.findall(r'1\s*:\s*1', text_lower, re.IGNORECASE))
-        n_to_one_count = len(re.findall(r'n\s*:\s*1', text_lower, re.IGNORECASE))
+        one_to_one_count = len(scan.findall(r'1\s*:\s*1'))
+        n_to_one_count = len(scan.findall(r'n\s*:\s*1'))
         
         if one_to_one_count > n_to_one_count:
             entities['forwarder_type'] = '1:1'
         elif n_to_one_count > 0:
             entities['forwarder_type'] = 'N:1'
         else:
-            if any(word in text_lower for word in ['dedicated', 'individual', 'separate']):
+            if any(scan.has(word) for word in ['dedicated', 'individual', 'separate']):
                 entities['forwarder_type'] = '1:1'
             else:
                 entities['forwarder_type'] = 'N:1'
 
-    def _extract_protocols_regex(self, text: str, entities: Dict):
+    def _extract_protocols_regex(self, text: str, entities: Dict, scan: ScanResult):
         """Enhanced protocol extraction - CASE INSENSITIVE"""
-        text_lower = text.lower()
         protocols = []
         
-        if re.search(r'ipv6|internet\s+protocol\s+version\s+6|v6\s+traffic', text_lower, re.IGNORECASE):
+        if scan.has(r'ipv6|internet\s+protocol\s+version\s+6|v6\s+traffic'):
             protocols.append('IPv6')
         
-        if re.search(r'pppoe|ppp\s+over\s+ethernet|ppp\s+traffic', text_lower, re.IGNORECASE):
+        if scan.has(r'pppoe|ppp\s+over\s+ethernet|ppp\s+traffic'):
             protocols.append('PPPoE')
         
         entities['protocols'] = protocols
 
-    def _detect_untagged_regex(self, text: str, entities: Dict):
+    def _detect_untagged_regex(self, text: str, entities: Dict, scan: ScanResult):
         """FIXED: Enhanced untagged detection - CASE INSENSITIVE and better logic"""
-        text_lower = text.lower()
-        
         # CRITICAL: Don't treat "without VLAN translation" as untagged
         if entities.get('has_vlan_translation') is False:
             return
         
         for pattern in self.untagged_patterns:
-            if re.search(pattern, text_lower, re.IGNORECASE):
+            if scan.has(pattern):
                 entities['is_untagged'] = True
                 return
 
     def _preprocess_text(self, text: str) -> str:
         """Clean and normalize text for better extraction"""
-        if pd.isna(text) or text == 'nan':
+        # Missing spreadsheet cells arrive as None/NaN (NaN != NaN) or "nan"
+        if text is None or text != text or text == 'nan':
             return ""
         
-        text = str(text).lower()
-        text = re.sub(r'\s+', ' ', text)
+        text = str(text)
+        if MAX_INPUT_CHARS and len(text) > MAX_INPUT_CHARS:
+            raise ValueError(f"Input is limited to {MAX_INPUT_CHARS} characters, got {len(text)}")
+        text = text.lower()
         text = re.sub(r'[^\w\s:,.-]', ' ', text)
+        # Collapse whitespace last: spaCy turns runs of spaces into tokens
+        text = re.sub(r'\s+', ' ', text)
         return text.strip()
 
     def _post_process_entities(self, entities: Dict):
@@ -697,146 +1688,570 @@ class AdvancedNLPEntityExtractor:
         
         # Set flags
         entities['is_multi_line'] = len(entities['lines']) > 1
-        entities['is_all_lines'] = len(entities['lines']) == 16
+        # "all 3 lines" on a 16-line chassis is just lines 1-3
+        entities['is_all_lines'] = len(entities['lines']) == self.profile.line_count
         
         if len(set(entities['line_forwarder_map'].values())) > 1:
             entities['mixed_forwarders'] = entities['discretization_config']
 
-print("✓ ULTIMATE FIXED Advanced NLP Entity Extraction Engine defined")
+log.info("✓ ULTIMATE FIXED Advanced NLP Entity Extraction Engine defined")
 
 
 # Cell 3: ULTIMATE FIXED Enhanced Intelligent Configuration Generator (COMPLETE VLAN FIX)
-class IntelligentConfigGenerator:
+class UserVSI:
+    """User side VSI attached to a subscriber line"""
+    __slots__ = ('number', 'vlan', 'pbit', 'line')
+
+    def __init__(self, number: int, vlan: Any, pbit: Any, line: int):
+        self.number = number
+        self.vlan = vlan
+        self.pbit = pbit
+        self.line = line
+
+    @property
+    def traffic_pbit(self) -> str:
+        """PBIT stamped on generated packets (first value of a PBIT list)"""
+        return str(self.pbit).split(',')[0]
+
+    def render(self) -> List[str]:
+        return [
+            f"UserVSI-{self.number} = VLAN={self.vlan}, PBIT={self.pbit}",
+            f"UserVSI-{self.number} Parent = Line{self.line}",
+        ]
+
+
+class NetworkVSI:
+    """Network side VSI attached to an uplink"""
+    __slots__ = ('number', 'vlan', 'pbit', 'uplink')
+
+    def __init__(self, number: int, vlan: Any, pbit: Any, uplink: int):
+        self.number = number
+        self.vlan = vlan
+        self.pbit = pbit
+        self.uplink = uplink
+
+    @property
+    def traffic_pbit(self) -> str:
+        """PBIT stamped on generated packets (first value of a PBIT list)"""
+        return str(self.pbit).split(',')[0]
+
+    def render(self) -> List[str]:
+        return [
+            f"NetworkVSI-{self.number} = VLAN={self.vlan}, PBIT={self.pbit}",
+            f"NetworkVSI-{self.number} Parent = Uplink{self.uplink}",
+        ]
+
+
+class Forwarder:
+    """Forwarder line; numbered ("Forwarder-2 1:1") or bare ("Forwarder = N:1")"""
+    __slots__ = ('forwarder_type', 'number', 'assign')
+
+    def __init__(self, forwarder_type: str, number: Optional[int] = None, assign: bool = False):
+        self.forwarder_type = forwarder_type
+        self.number = number
+        self.assign = assign  # bare form written with "=" ("Forwarder = 1:1")
+
+    def render(self) -> List[str]:
+        if self.number is not None:
+            return [f"Forwarder-{self.number} {self.forwarder_type}"]
+        if self.assign:
+            return [f"Forwarder = {self.forwarder_type}"]
+        return [f"Forwarder {self.forwarder_type}"]
+
+
+class VLANAllocator:
+    """VLAN IDs in use per port (LineN or UplinkN), one 4096-bit bitmap each.
+
+    reserve() and in_use() are single bit operations. next_free() turns the
+    bitmap into an int and isolates the lowest clear bit, so it doesn't
+    walk IDs one by one. Collisions between different VSIs on the same
+    port and IDs outside 1-4094 are recorded in `conflicts` instead of
+    being silently emitted. The requested ID is always emitted as asked;
+    an out-of-range conflict suggests the next free ID on its port.
+    """
+    __slots__ = ('_bitmaps', '_owners', 'conflicts')
+
+    MIN_VLAN = 1
+    MAX_VLAN = 4094
+
     def __init__(self):
-        self.entity_extractor = AdvancedNLPEntityExtractor()
+        self._bitmaps = {}  # port -> bytearray(512)
+        self._owners = {}   # (port, vlan) -> VSI name, for conflict reports
+        self.conflicts = []
 
-    def generate_configuration(self, input_text: str, minimal: bool = False) -> str:
-        """Generate complete configuration from input text with ULTIMATE fixes"""
-        entities = self.entity_extractor.extract_comprehensive_entities(input_text)
-        
-        # Generate VSI configuration
-        vsi_config = self._generate_vsi_configuration(entities)
-        
-        if minimal:
-            return vsi_config
-        
-        # Generate traffic configuration
-        traffic_config = self._generate_traffic_configuration(entities, vsi_config)
-        return vsi_config + "\n" + traffic_config
+    def in_use(self, port: str, vlan: int) -> bool:
+        bitmap = self._bitmaps.get(port)
+        return bitmap is not None and bool(bitmap[vlan >> 3] & (1 << (vlan & 7)))
 
-    def _generate_vsi_configuration(self, entities: Dict) -> str:
-        """Generate VSI configuration with ULTIMATE fixes"""
-        lines = ["Entity1 = DUT", "Entity1 Keywords ="]
-        
-        # Check for multi-service configurations FIRST
-        if entities.get('is_multi_service'):
-            return self._generate_multi_service_config_fixed(entities, lines)
-        
-        # Check for discretization configurations
-        elif entities.get('line_forwarder_map'):
-            return self._generate_discretized_config(entities, lines)
-        
-        elif entities['is_all_lines'] or entities['is_multi_line']:
-            return self._generate_multi_line_config_fixed(entities, lines)
-        
-        else:
-            return self._generate_single_line_config_fixed(entities, lines)
+    def next_free(self, port: str, start: int = MIN_VLAN) -> Optional[int]:
+        """Lowest free VLAN >= start on the port (wrapping to MIN_VLAN); None when full"""
+        bitmap = self._bitmaps.get(port)
+        used = int.from_bytes(bitmap, 'little') if bitmap is not None else 0
+        for base in (start, self.MIN_VLAN):
+            shifted = used >> base
+            vlan = base + ((shifted + 1) & ~shifted).bit_length() - 1
+            if vlan <= self.MAX_VLAN:
+                return vlan
+        return None
 
-    def _generate_multi_service_config_fixed(self, entities: Dict, lines: List[str]) -> str:
-        """FIXED: Generate multi-service configuration using separate VSI entries"""
-        service_count = entities.get('service_count', 1)
-        service_type = entities.get('service_type', entities['forwarder_type'])
-        target_lines = entities['lines']
+    def reserve(self, port: str, vlan: Any, owner: str) -> Any:
+        """Mark vlan as used by owner and return the VLAN to emit.
+
+        Non-numeric values ("No" for untagged) are returned unchanged.
+        """
+        if isinstance(vlan, str):
+            if not vlan.isdigit():
+                return vlan
+            vlan_id = int(vlan)
+        elif isinstance(vlan, int):
+            vlan_id = vlan
+        else:
+            return vlan
         
-        print(f"🔧 Generating FIXED multi-service config: {service_count} services of type {service_type}")
+        if not self.MIN_VLAN <= vlan_id <= self.MAX_VLAN:
+            self.conflicts.append({
+                'port': port, 'vlan': vlan_id, 'vsi': owner,
+                'conflict': f"outside {self.MIN_VLAN}-{self.MAX_VLAN}", 'suggested': self.next_free(port),
+            })
+            return vlan
+        
+        bitmap = self._bitmaps.get(port)
+        if bitmap is None:
+            bitmap = self._bitmaps[port] = bytearray((self.MAX_VLAN >> 3) + 1)
+        bit = 1 << (vlan_id & 7)
+        if bitmap[vlan_id >> 3] & bit:
+            holder = self._owners[port, vlan_id]
+            if holder != owner:
+                self.conflicts.append({
+                    'port': port, 'vlan': vlan_id, 'vsi': owner,
+                    'conflict': f"already used by {holder}",
+                })
+            return vlan
+        bitmap[vlan_id >> 3] |= bit
+        self._owners[port, vlan_id] = owner
+        return vlan
+
+
+class VSIConfiguration:
+    """In-memory VSI section: VSIs and forwarders in output order.
+
+    The traffic generators read VLAN/PBIT mappings straight from
+    user_vsis/network_vsis (keyed by VSI number, last definition wins)
+    instead of re-parsing the rendered text. Every VSI's VLAN goes
+    through the allocator: per line for UserVSIs, per uplink for
+    NetworkVSIs.
+    """
+    __slots__ = ('items', 'user_vsis', 'network_vsis', 'allocator')
+
+    HEADER = ("Entity1 = DUT", "Entity1 Keywords =")
+
+    def __init__(self):
+        self.items = []
+        self.user_vsis = {}
+        self.network_vsis = {}
+        self.allocator = VLANAllocator()
+
+    @property
+    def vlan_conflicts(self) -> List[Dict[str, Any]]:
+        return self.allocator.conflicts
+
+    def add_user(self, number: int, vlan: Any, pbit: Any, line: int) -> UserVSI:
+        vlan = self.allocator.reserve(f"Line{line}", vlan, f"UserVSI-{number}")
+        vsi = UserVSI(number, vlan, pbit, line)
+        self.items.append(vsi)
+        self.user_vsis[number] = vsi
+        return vsi
+
+    def add_network(self, number: int, vlan: Any, pbit: Any, uplink: int) -> NetworkVSI:
+        vlan = self.allocator.reserve(f"Uplink{uplink}", vlan, f"NetworkVSI-{number}")
+        vsi = NetworkVSI(number, vlan, pbit, uplink)
+        self.items.append(vsi)
+        self.network_vsis[number] = vsi
+        return vsi
+
+    def add_forwarder(self, forwarder_type: str, number: Optional[int] = None, assign: bool = False) -> Forwarder:
+        forwarder = Forwarder(forwarder_type, number, assign)
+        self.items.append(forwarder)
+        return forwarder
+
+    def iter_lines(self) -> Iterator[str]:
+        yield from self.HEADER
+        for item in self.items:
+            yield from item.render()
+
+    def render(self) -> str:
+        return "\n".join(self.iter_lines())
+
+
+class PacketSpec:
+    """One generated/received packet in a traffic section.
+
+    heading is the shared "Packet LineN L2 Header" string from the
+    PacketHeaderTable and body the already rendered MAC/VLAN/protocol
+    lines, so rendering a packet is a lookup rather than formatting.
+    """
+    __slots__ = ('heading', 'body')
+
+    def __init__(self, heading: str, body: str):
+        self.heading = heading
+        self.body = body
+
+    def render(self) -> Tuple[str, str]:
+        return self.heading, self.body
+
+
+def line_mac(base: str, line_num: int, last_octet: str, pad: bool = True) -> str:
+    """Per-line MAC: the line number is written in decimal into octet 5.
+
+    Lines above 99 carry their hundreds in octet 4 (offset by 10 so they
+    never collide with the base octet used by lines 1-99), which keeps
+    addresses valid and unique on chassis with thousands of lines.
+    """
+    if line_num > 99:
+        return f"{base.rsplit(':', 1)[0]}:{line_num // 100 + 10:02d}:{line_num % 100:02d}:{last_octet}"
+    return f"{base}:{line_num:02d}:{last_octet}" if pad else f"{base}:{line_num}:{last_octet}"
+
+
+class PacketHeaderTable:
+    """Precomputed per-line and per-service packet header pieces.
+
+    Built once per generator: the "Packet LineN L2 Header" heading and the
+    (user side, network side) MAC pairs for every line of the DUT profile,
+    and the MAC pair for services 1-99. The table is shared by every
+    request, so indexes outside the prebuilt range (they come straight
+    from prompts) are formatted on each use and never stored.
+    """
+    __slots__ = ('_headings', '_line_macs', '_service_macs')
+
+    USER_MAC = ("99:02:03:04", "11")
+    NETWORK_MAC = ("98:0A:0B:0C", "0C")
+    SINGLE_LINE_HEADING = "Packet L2 Header"
+    SINGLE_LINE_MACS = ("99:02:03:04:05:06", "98:0A:0B:0C:0D:0E")
+
+    def __init__(self, line_count: int, service_count: int = 99):
+        lines = range(1, line_count + 1)
+        self._headings = {line_num: self._format_heading(line_num) for line_num in lines}
+        # (line, pad) -> (user MAC, network MAC)
+        self._line_macs = {(line_num, pad): self._format_line_macs(line_num, pad)
+                           for line_num in lines for pad in (True, False)}
+        self._service_macs = {service_num: self._format_service_macs(service_num)
+                              for service_num in range(1, service_count + 1)}
+
+    @staticmethod
+    def _format_heading(line_num: int) -> str:
+        return f"Packet Line{line_num} L2 Header"
+
+    @classmethod
+    def _format_line_macs(cls, line_num: int, pad: bool) -> Tuple[str, str]:
+        return (line_mac(cls.USER_MAC[0], line_num, cls.USER_MAC[1], pad),
+                line_mac(cls.NETWORK_MAC[0], line_num, cls.NETWORK_MAC[1], pad))
+
+    @classmethod
+    def _format_service_macs(cls, service_num: int) -> Tuple[str, str]:
+        return (f"{cls.USER_MAC[0]}:{service_num:02d}:{cls.USER_MAC[1]}",
+                f"{cls.NETWORK_MAC[0]}:{service_num:02d}:{cls.NETWORK_MAC[1]}")
+
+    def heading(self, line_num: int) -> str:
+        heading = self._headings.get(line_num)
+        return heading if heading is not None else self._format_heading(line_num)
+
+    def line_macs(self, line_num: int, pad: bool = True) -> Tuple[str, str]:
+        """MACs of a line; unpadded ("99:02:03:04:4:11") for specific-line prompts"""
+        macs = self._line_macs.get((line_num, pad))
+        return macs if macs is not None else self._format_line_macs(line_num, pad)
+
+    def service_macs(self, service_num: int) -> Tuple[str, str]:
+        macs = self._service_macs.get(service_num)
+        return macs if macs is not None else self._format_service_macs(service_num)
+
+    @staticmethod
+    def body(src_mac: str, dst_mac: str, vlan: Any, pbit: Any, untagged: bool = False, headers: Tuple[str, ...] = ()) -> str:
+        """Packet lines after the heading: MACs, VLAN/PBIT and protocol headers"""
+        vlan_line = "VLAN=No, PBIT=No" if untagged else f"VLAN = {vlan}, PBIT = {pbit}"
+        return "\n".join((f"Src MAC = {src_mac}", f"Dst MAC = {dst_mac}", vlan_line) + headers)
+
+
+class TrafficConfiguration:
+    """In-memory traffic section: blocks of heading lines followed by packets"""
+    __slots__ = ('blocks',)
+
+    def __init__(self):
+        self.blocks = []
+
+    def add_block(self, *heading: str) -> List[PacketSpec]:
+        """Start a block and return its packet list for the caller to fill"""
+        packets = []
+        self.blocks.append((heading, packets))
+        return packets
+
+    def iter_lines(self) -> Iterator[str]:
+        return self.iter_block_lines(self.blocks)
+
+    @staticmethod
+    def iter_block_lines(blocks: Iterable[Tuple[Tuple[str, ...], Iterable[PacketSpec]]]) -> Iterator[str]:
+        """Lines of (heading, packets) blocks; packets may be lazy iterators"""
+        for heading, packets in blocks:
+            yield from heading
+            for packet in packets:
+                yield from packet.render()
+
+    def render(self) -> str:
+        return "\n".join(self.iter_lines())
+
+
+# Characters per chunk when configurations are streamed instead of joined
+STREAM_CHUNK_SIZE = int(os.environ.get('STREAM_CHUNK_SIZE', 64 * 1024))
+
+
+def iter_text_chunks(lines: Iterable[str], chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[str]:
+    """Join lines with newlines in chunks of about chunk_size characters.
+
+    "".join() of the chunks equals "\\n".join(lines), but only one chunk
+    is held in memory at a time.
+    """
+    buffer, size, started = [], 0, False
+    for line in lines:
+        buffer.append(line)
+        size += len(line) + 1
+        if size >= chunk_size:
+            yield ("\n" if started else "") + "\n".join(buffer)
+            buffer, size, started = [], 0, True
+    if buffer:
+        yield ("\n" if started else "") + "\n".join(buffer)
+
+
+class GenerationResult:
+    """Everything produced by one pass of IntelligentConfigGenerator.generate()"""
+
+    def __init__(self, entities: Dict[str, Any], vsi_config: str, traffic_config: Optional[str] = None,
+                 vlan_conflicts: Optional[List[Dict[str, Any]]] = None):
+        self.entities = entities
+        self.vsi_config = vsi_config
+        self.traffic_config = traffic_config  # None for minimal (VSI-only) output
+        self.vlan_conflicts = vlan_conflicts or []
+
+    @property
+    def configuration(self) -> str:
+        """Full configuration text: VSI section followed by the traffic section"""
+        if self.traffic_config is None:
+            return self.vsi_config
+        return self.vsi_config + "\n" + self.traffic_config
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'configuration': self.configuration,
+            'entities': self.entities,
+            'vlan_conflicts': self.vlan_conflicts,
+        }
+
+
+def vsi_scenario(entities: Dict) -> str:
+    """Branch _generate_vsi_configuration takes for the entities, as a metrics label"""
+    if entities.get('is_multi_service'):
+        return 'multi-service'
+    if entities.get('line_forwarder_map'):
+        return 'discretized'
+    if entities.get('is_all_lines') or entities.get('is_multi_line'):
+        if entities.get('specific_lines') and not entities.get('is_all_lines'):
+            return 'specific-lines'
+        if entities.get('any_lines_scenario'):
+            return 'any-lines'
+        return 'all-lines' if entities.get('is_all_lines') else 'multi-line'
+    return 'single-line'
+
+
+class IntelligentConfigGenerator:
+    # Traffic blocks in output order: heading lines, the side whose
+    # VLAN/PBIT the packets carry, and whether the network side sends
+    TRAFFIC_BLOCKS = (
+        (("Test Eqpt - Upstream", "Entity2 = User Side Traffic Eqpt", "Entity2 Keywords=",
+          "NumPackets To Generate = 100"), 'user', False),
+        (("Entity3 = Network Side Traffic Eqpt", "Entity3 Keywords=", "NumPackets To Recieve = 100"), 'network', False),
+        (("Test Eqpt - Downstream", "Entity3 = Network Side Traffic Eqpt", "Entity3 Keywords=",
+          "NumPackets To Generate = 100"), 'network', True),
+        (("Entity2 = User Side Traffic Eqpt", "Entity2 Keywords=", "NumPackets To Recieve = 100"), 'user', True),
+    )
+
+    def __init__(self, profile: Optional[DUTProfile] = None):
+        self.entity_extractor = AdvancedNLPEntityExtractor(profile=profile)
+        self.packet_headers = PacketHeaderTable(self.entity_extractor.profile.line_count)
+
+    def generate(self, input_text: str, minimal: bool = False, entities: Optional[Dict[str, Any]] = None) -> GenerationResult:
+        """Extract entities once (unless already extracted) and build the VSI (and traffic) sections from them"""
+        clock = time.perf_counter
+        started = clock()
+        extracted = entities is None
+        if extracted:
+            entities = self.entity_extractor.extract_comprehensive_entities(input_text)
+        scenario = vsi_scenario(entities)
+        
+        # Build the VSI model; text is rendered once, after traffic has read it
+        t_extract = clock()
+        vsi = self._build_vsi(entities)
+        t_vsi = clock()
+        
+        traffic = None
+        if not minimal:
+            # Generate traffic configuration from the same model
+            traffic = self._generate_traffic_configuration(entities, vsi)
+        t_traffic = clock()
+        result = GenerationResult(entities, vsi.render(), traffic.render() if traffic is not None else None, vsi.vlan_conflicts)
+        t_render = clock()
+        
+        if extracted:
+            observe_stage(t_extract - started, 'extract', scenario)
+        observe_stage(t_vsi - t_extract, 'vsi', scenario)
+        if traffic is not None:
+            observe_stage(t_traffic - t_vsi, 'traffic', scenario)
+        observe_stage(t_render - t_traffic, 'render', scenario)
+        return result
+
+    def _build_vsi(self, entities: Dict) -> VSIConfiguration:
+        """VSI model for the entities, warning once about its VLAN conflicts (each one at debug level)"""
+        vsi = self._generate_vsi_configuration(entities)
+        conflicts = vsi.vlan_conflicts
+        if conflicts:
+            log.warning("⚠ %d VLAN conflict(s), first: VLAN %s on %s for %s: %s", len(conflicts),
+                        conflicts[0]['vlan'], conflicts[0]['port'], conflicts[0]['vsi'], conflicts[0]['conflict'],
+                        extra={'vlan_conflicts': len(conflicts)})
+            if log.isEnabledFor(logging.DEBUG):
+                for conflict in conflicts:
+                    log.debug("⚠ VLAN %s on %s for %s: %s", conflict['vlan'], conflict['port'], conflict['vsi'],
+                              conflict['conflict'], extra={'suggested': conflict.get('suggested')})
+        return vsi
+
+    def generate_stream(self, input_text: str, minimal: bool = False,
+                        entities: Optional[Dict[str, Any]] = None) -> Tuple[GenerationResult, Iterator[str]]:
+        """Like generate(), but render lazily: returns a result without text and an iterator of text chunks.
+
+        Extraction, the VSI model and the traffic rows are built up front,
+        so errors surface before the first chunk. Traffic packets are
+        generated while streaming, so memory is bounded by the VSI model
+        rather than the size of the configuration text.
+        """
+        clock = time.perf_counter
+        started = clock()
+        extracted = entities is None
+        if extracted:
+            entities = self.entity_extractor.extract_comprehensive_entities(input_text)
+        scenario = vsi_scenario(entities)
+        
+        t_extract = clock()
+        vsi = self._build_vsi(entities)
+        t_vsi = clock()
+        if extracted:
+            observe_stage(t_extract - started, 'extract', scenario)
+        observe_stage(t_vsi - t_extract, 'vsi', scenario)
+        result = GenerationResult(entities, '', vlan_conflicts=vsi.vlan_conflicts)
+        if minimal:
+            return result, iter_text_chunks(vsi.iter_lines())
+        
+        # Only the per-line/per-service rows are built here; packets are
+        # produced as the traffic section is streamed
+        blocks = self._traffic_blocks(entities, vsi)
+        observe_stage(clock() - t_vsi, 'traffic', scenario)
+        return result, iter_text_chunks(itertools.chain(vsi.iter_lines(), TrafficConfiguration.iter_block_lines(blocks)))
+
+    def generate_configuration(self, input_text: str, minimal: bool = False) -> str:
+        """Generate complete configuration from input text with ULTIMATE fixes"""
+        return self.generate(input_text, minimal=minimal).configuration
+
+    def _generate_vsi_configuration(self, entities: Dict) -> VSIConfiguration:
+        """Generate VSI configuration with ULTIMATE fixes"""
+        vsi = VSIConfiguration()
+        
+        # Check for multi-service configurations FIRST
+        if entities.get('is_multi_service'):
+            return self._generate_multi_service_config_fixed(entities, vsi)
+        
+        # Check for discretization configurations
+        elif entities.get('line_forwarder_map'):
+            return self._generate_discretized_config(entities, vsi)
+        
+        elif entities['is_all_lines'] or entities['is_multi_line']:
+            return self._generate_multi_line_config_fixed(entities, vsi)
+        
+        else:
+            return self._generate_single_line_config_fixed(entities, vsi)
+
+    def _generate_multi_service_config_fixed(self, entities: Dict, vsi: VSIConfiguration) -> VSIConfiguration:
+        """FIXED: Generate multi-service configuration using separate VSI entries"""
+        service_count = entities.get('service_count', 1)
+        service_type = entities.get('service_type', entities['forwarder_type'])
+        target_lines = entities['lines']
+        
+        log.debug("🔧 Generating FIXED multi-service config: %s services of type %s", service_count, service_type)
         
         if len(target_lines) == 1:
             # Single line with multiple services
             line_num = target_lines[0]
-            return self._generate_single_line_multi_service_fixed(entities, lines, line_num, service_count, service_type)
+            return self._generate_single_line_multi_service_fixed(entities, vsi, line_num, service_count, service_type)
         else:
             # CRITICAL FIX: Multiple lines with services
-            return self._generate_multi_line_multi_service_fixed(entities, lines, target_lines, service_count, service_type)
+            return self._generate_multi_line_multi_service_fixed(entities, vsi, target_lines, service_count, service_type)
+
+    def _service_pbits(self, entities: Dict, service_count: int, all_pbit_range: bool = False) -> List[Any]:
+        """PBIT per service: 0, 2, 5 cycling for "different pbit", else one value for every service"""
+        if entities.get('different_pbit_per_service'):
+            return list(itertools.islice(itertools.cycle((0, 2, 5)), service_count))
+        if all_pbit_range and entities.get('all_pbit_range'):
+            return ["0,1,2,3,4,5,6,7"] * service_count
+        return [0] * service_count
 
-    def _generate_single_line_multi_service_fixed(self, entities: Dict, lines: List[str], line_num: int, service_count: int, service_type: str) -> str:
+    def _generate_single_line_multi_service_fixed(self, entities: Dict, vsi: VSIConfiguration, line_num: int, service_count: int, service_type: str) -> VSIConfiguration:
         """FIXED: Generate multiple services on a single line with different PBITs"""
         vsi_counter = 1
+        # Service i gets VLAN 101+i on both sides (transparent 1:1, individual N:1)
+        pbits = self._service_pbits(entities, service_count, all_pbit_range=True)
         
         for service_idx in range(service_count):
-            # Determine VLANs based on service type and context
-            user_vlan = 101 + service_idx  # 101, 102, 103, ...
-            if service_type == '1:1':
-                network_vlan = user_vlan  # Transparent for 1:1
-            else:  # N:1
-                network_vlan = user_vlan  # Individual N:1 services use same VLAN
-            
-            # CRITICAL FIX: Determine PBIT based on "different pbit"
-            if entities.get('different_pbit_per_service'):
-                # Use different PBITs: 0, 2, 5, cycling
-                pbit_values = [0, 2, 5]
-                user_pbit = pbit_values[service_idx % len(pbit_values)]
-                network_pbit = user_pbit
-            elif entities.get('all_pbit_range'):
-                pbit_list = "0,1,2,3,4,5,6,7"
-                user_pbit = pbit_list
-                network_pbit = pbit_list
-            else:
-                user_pbit = 0
-                network_pbit = 0
+            user_vlan = network_vlan = 101 + service_idx
+            user_pbit = network_pbit = pbits[service_idx]
             
             # Generate UserVSI
-            lines.append(f"UserVSI-{vsi_counter} = VLAN={user_vlan}, PBIT={user_pbit}")
-            lines.append(f"UserVSI-{vsi_counter} Parent = Line{line_num}")
+            vsi.add_user(vsi_counter, user_vlan, user_pbit, line_num)
             
             # Generate NetworkVSI
-            lines.append(f"NetworkVSI-{vsi_counter} = VLAN={network_vlan}, PBIT={network_pbit}")
-            lines.append(f"NetworkVSI-{vsi_counter} Parent = Uplink{entities['uplinks'][0]}")
+            vsi.add_network(vsi_counter, network_vlan, network_pbit, entities['uplinks'][0])
             
             # FIXED: Generate individual forwarders for each service
             if service_idx < service_count - 1:  # Not the last service
-                lines.append(f"Forwarder-{vsi_counter} {service_type}")
+                vsi.add_forwarder(service_type, number=vsi_counter)
             else:  # Last service
-                lines.append(f"Forwarder {service_type}")
+                vsi.add_forwarder(service_type)
             
             vsi_counter += 1
         
-        return "\n".join(lines)
+        return vsi
 
-    def _generate_multi_line_multi_service_fixed(self, entities: Dict, lines: List[str], target_lines: List[int], service_count: int, service_type: str) -> str:
+    def _generate_multi_line_multi_service_fixed(self, entities: Dict, vsi: VSIConfiguration, target_lines: List[int], service_count: int, service_type: str) -> VSIConfiguration:
         """CRITICAL FIX: Generate services across multiple lines - CREATE SERVICES ON ALL LINES"""
         vsi_counter = 1
         
+        pbits = self._service_pbits(entities, service_count)
+        
         # CRITICAL FIX: For multi-line services, create UserVSI for EACH line for EACH service
         for service_idx in range(service_count):
-            user_vlan = 101 + service_idx
-            network_vlan = user_vlan
-            
-            # CRITICAL FIX: Determine PBIT based on "different pbit"
-            if entities.get('different_pbit_per_service'):
-                pbit_values = [0, 2, 5]
-                pbit = pbit_values[service_idx % len(pbit_values)]
-            else:
-                pbit = 0
+            user_vlan = network_vlan = 101 + service_idx
+            pbit = pbits[service_idx]
             
             # CRITICAL FIX: Create UserVSI for EACH line for this service
             for line_num in target_lines:
-                lines.append(f"UserVSI-{vsi_counter} = VLAN={user_vlan}, PBIT={pbit}")
-                lines.append(f"UserVSI-{vsi_counter} Parent = Line{line_num}")
+                vsi.add_user(vsi_counter, user_vlan, pbit, line_num)
                 vsi_counter += 1
             
             # Create single NetworkVSI for this service
-            lines.append(f"NetworkVSI-{service_idx + 1} = VLAN={network_vlan}, PBIT={pbit}")
-            lines.append(f"NetworkVSI-{service_idx + 1} Parent = Uplink{entities['uplinks'][0]}")
+            vsi.add_network(service_idx + 1, network_vlan, pbit, entities['uplinks'][0])
             
             # Generate Forwarder for this service
             if service_idx < service_count - 1:  # Not the last service
-                lines.append(f"Forwarder-{service_idx + 1} {service_type}")
+                vsi.add_forwarder(service_type, number=service_idx + 1)
             else:  # Last service - FIXED FORWARDER FORMAT
-                lines.append(f"Forwarder-{service_idx + 1} 1:1")  # Expected format in test case 23
+                vsi.add_forwarder('1:1', number=service_idx + 1)  # Expected format in test case 23
         
-        return "\n".join(lines)
+        return vsi
 
-    def _generate_discretized_config(self, entities: Dict, lines: List[str]) -> str:
+    def _generate_discretized_config(self, entities: Dict, vsi: VSIConfiguration) -> VSIConfiguration:
         """Generate discretized configuration with different forwarder types per line group"""
         line_forwarder_map = entities['line_forwarder_map']
         all_lines = sorted(entities['lines'])
@@ -845,8 +2260,7 @@ class IntelligentConfigGenerator:
         for i, line_num in enumerate(all_lines):
             user_vlan = 101 + (line_num - 1)  # VLAN starts from 101
             user_pbit = self._get_user_pbit(entities, i)
-            lines.append(f"UserVSI-{line_num} = VLAN={user_vlan}, PBIT={user_pbit}")
-            lines.append(f"UserVSI-{line_num} Parent = Line{line_num}")
+            vsi.add_user(line_num, user_vlan, user_pbit, line_num)
         
         # Generate NetworkVSI entries based on forwarder mapping
         network_vsi_counter = 1
@@ -865,41 +2279,40 @@ class IntelligentConfigGenerator:
                 for line_num in sorted(group_lines):
                     network_vlan = 1000 + line_num  # Network VLAN starts from 1001
                     network_pbit = self._get_network_pbit(entities, 0)
-                    lines.append(f"NetworkVSI-{line_num} = VLAN={network_vlan}, PBIT={network_pbit}")
-                    lines.append(f"NetworkVSI-{line_num} Parent = Uplink{entities['uplinks'][0]}")
-                    lines.append(f"Forwarder-{line_num} 1:1")
+                    vsi.add_network(line_num, network_vlan, network_pbit, entities['uplinks'][0])
+                    vsi.add_forwarder('1:1', number=line_num)
             else:  # N:1
                 # Single NetworkVSI for all lines in this group
                 network_vlan = 1000 + min(group_lines)
                 network_pbit = self._get_network_pbit(entities, 0)
-                lines.append(f"NetworkVSI-{network_vsi_counter} = VLAN={network_vlan}, PBIT={network_pbit}")
-                lines.append(f"NetworkVSI-{network_vsi_counter} Parent = Uplink{entities['uplinks'][0]}")
-                lines.append(f"Forwarder-{network_vsi_counter} N:1")
+                vsi.add_network(network_vsi_counter, network_vlan, network_pbit, entities['uplinks'][0])
+                vsi.add_forwarder('N:1', number=network_vsi_counter)
                 network_vsi_counter += 1
         
-        return "\n".join(lines)
+        return vsi
 
-    def _generate_multi_line_config_fixed(self, entities: Dict, lines: List[str]) -> str:
+    def _generate_multi_line_config_fixed(self, entities: Dict, vsi: VSIConfiguration) -> VSIConfiguration:
         """CRITICAL FIX: Generate complete multi-line configuration - ALWAYS include NetworkVSI and Forwarder"""
         target_lines = entities['lines']
         forwarder_type = entities['forwarder_type']
         
-        print(f"🔧 Multi-line config for lines {target_lines}, forwarder {forwarder_type}")
+        if log.isEnabledFor(logging.DEBUG):
+            shown = target_lines if len(target_lines) <= 16 else f"{target_lines[:16]}... ({len(target_lines)} lines)"
+            log.debug("🔧 Multi-line config for lines %s, forwarder %s", shown, forwarder_type)
         
         # Handle specific line configurations (e.g., line 4, line 8, line 12, line 16)
         if entities.get('specific_lines') and not entities['is_all_lines']:
-            return self._generate_specific_lines_config_fixed(entities, lines)
+            return self._generate_specific_lines_config_fixed(entities, vsi)
         
         # CRITICAL FIX: Special handling for "any 2 lines" scenario
         if entities.get('any_lines_scenario'):
-            return self._generate_any_lines_config_fixed(entities, lines)
+            return self._generate_any_lines_config_fixed(entities, vsi)
         
         # CRITICAL FIX: Generate UserVSI for each line FIRST
         for i, line_num in enumerate(target_lines):
             user_vlan = self._get_user_vlan_fixed(entities, i, line_num)
             user_pbit = self._get_user_pbit(entities, i)
-            lines.append(f"UserVSI-{i+1} = VLAN={user_vlan}, PBIT={user_pbit}")
-            lines.append(f"UserVSI-{i+1} Parent = Line{line_num}")
+            vsi.add_user(i+1, user_vlan, user_pbit, line_num)
         
         # CRITICAL FIX: ALWAYS generate NetworkVSI and Forwarder for ALL multi-line scenarios
         if entities['is_all_lines']:
@@ -911,51 +2324,45 @@ class IntelligentConfigGenerator:
                     for i, line_num in enumerate(target_lines):
                         network_vlan = 1001 + i  # 1001, 1002, 1003, ...
                         network_pbit = self._get_network_pbit(entities, i)
-                        lines.append(f"NetworkVSI-{i+1} = VLAN={network_vlan}, PBIT={network_pbit}")
-                        lines.append(f"NetworkVSI-{i+1} Parent = Uplink{entities['uplinks'][0]}")
-                        lines.append(f"Forwarder-{i+1} 1:1")
+                        vsi.add_network(i+1, network_vlan, network_pbit, entities['uplinks'][0])
+                        vsi.add_forwarder('1:1', number=i+1)
                 elif entities.get('has_vlan_translation') is False:
                     # CRITICAL FIX: Without VLAN translation: use same VLANs as user (NOT untagged!)
                     for i, line_num in enumerate(target_lines):
                         user_vlan = self._get_user_vlan_for_all_lines_fixed(entities, i, line_num)
                         network_pbit = self._get_network_pbit(entities, i)
-                        lines.append(f"NetworkVSI-{i+1} = VLAN={user_vlan}, PBIT={network_pbit}")
-                        lines.append(f"NetworkVSI-{i+1} Parent = Uplink{entities['uplinks'][0]}")
-                        lines.append(f"Forwarder-{i+1} 1:1")
+                        vsi.add_network(i+1, user_vlan, network_pbit, entities['uplinks'][0])
+                        vsi.add_forwarder('1:1', number=i+1)
                 else:
                     # Default 1:1 behavior (transparent)
                     for i, line_num in enumerate(target_lines):
                         user_vlan = self._get_user_vlan_for_all_lines_fixed(entities, i, line_num)
                         network_pbit = self._get_network_pbit(entities, i)
-                        lines.append(f"NetworkVSI-{i+1} = VLAN={user_vlan}, PBIT={network_pbit}")
-                        lines.append(f"NetworkVSI-{i+1} Parent = Uplink{entities['uplinks'][0]}")
-                        lines.append(f"Forwarder-{i+1} 1:1")
+                        vsi.add_network(i+1, user_vlan, network_pbit, entities['uplinks'][0])
+                        vsi.add_forwarder('1:1', number=i+1)
             else:  # N:1
                 # Single NetworkVSI for all lines
                 network_vlan = self._get_network_vlan_for_group(entities, target_lines, forwarder_type)
                 network_pbit = self._get_network_pbit(entities, 0)
-                lines.append(f"NetworkVSI-1 = VLAN={network_vlan}, PBIT={network_pbit}")
-                lines.append(f"NetworkVSI-1 Parent = Uplink{entities['uplinks'][0]}")
-                lines.append("Forwarder N:1")
+                vsi.add_network(1, network_vlan, network_pbit, entities['uplinks'][0])
+                vsi.add_forwarder('N:1')
         else:
             # CRITICAL FIX: Regular multi-line logic (like "line 1 and line 2") - ALWAYS include NetworkVSI and Forwarder!
             if forwarder_type == '1:1':
                 for i, line_num in enumerate(target_lines):
                     network_vlan = self._get_network_vlan_for_line_fixed(entities, line_num, forwarder_type)
                     network_pbit = self._get_network_pbit(entities, i)
-                    lines.append(f"NetworkVSI-{i+1} = VLAN={network_vlan}, PBIT={network_pbit}")
-                    lines.append(f"NetworkVSI-{i+1} Parent = Uplink{entities['uplinks'][0]}")
-                    lines.append(f"Forwarder-{i+1} 1:1")
+                    vsi.add_network(i+1, network_vlan, network_pbit, entities['uplinks'][0])
+                    vsi.add_forwarder('1:1', number=i+1)
             else:  # N:1 - CRITICAL FIX FOR TEST CASE 16
                 network_vlan = self._get_network_vlan_for_group(entities, target_lines, forwarder_type)
                 network_pbit = self._get_network_pbit(entities, 0)
-                lines.append(f"NetworkVSI-1 = VLAN={network_vlan}, PBIT={network_pbit}")
-                lines.append(f"NetworkVSI-1 Parent = Uplink{entities['uplinks'][0]}")
-                lines.append("Forwarder = N:1")  # FIXED FORMAT
+                vsi.add_network(1, network_vlan, network_pbit, entities['uplinks'][0])
+                vsi.add_forwarder('N:1', assign=True)  # FIXED FORMAT
         
-        return "\n".join(lines)
+        return vsi
 
-    def _generate_any_lines_config_fixed(self, entities: Dict, lines: List[str]) -> str:
+    def _generate_any_lines_config_fixed(self, entities: Dict, vsi: VSIConfiguration) -> VSIConfiguration:
         """CRITICAL FIX: Generate configuration for 'any 2 lines' scenario with correct VLANs"""
         target_lines = entities['lines']  # [5, 13]
         forwarder_type = entities['forwarder_type']
@@ -965,19 +2372,17 @@ class IntelligentConfigGenerator:
             # Use VLAN 201 for "any 2 lines" scenario
             user_vlan = 201
             user_pbit = self._get_user_pbit(entities, i)
-            lines.append(f"UserVSI-{i+1} = VLAN={user_vlan}, PBIT={user_pbit}")
-            lines.append(f"UserVSI-{i+1} Parent = Line{line_num}")
+            vsi.add_user(i+1, user_vlan, user_pbit, line_num)
         
         # CRITICAL FIX: Generate NetworkVSI with VLAN 2001 for "any 2 lines"
         network_vlan = 2001
         network_pbit = self._get_network_pbit(entities, 0)
-        lines.append(f"NetworkVSI-1 = VLAN={network_vlan}, PBIT={network_pbit}")
-        lines.append(f"NetworkVSI-1 Parent = Uplink{entities['uplinks'][0]}")
-        lines.append(f"Forwarder = {forwarder_type}")
+        vsi.add_network(1, network_vlan, network_pbit, entities['uplinks'][0])
+        vsi.add_forwarder(forwarder_type, assign=True)
         
-        return "\n".join(lines)
+        return vsi
 
-    def _generate_specific_lines_config_fixed(self, entities: Dict, lines: List[str]) -> str:
+    def _generate_specific_lines_config_fixed(self, entities: Dict, vsi: VSIConfiguration) -> VSIConfiguration:
         """FIXED: Generate configuration for specific lines (e.g., line 4, 8, 12, 16)"""
         target_lines = entities['specific_lines']
         forwarder_type = entities['forwarder_type']
@@ -993,8 +2398,7 @@ class IntelligentConfigGenerator:
                 user_pbit = self._get_user_pbit(entities, i)
             
             # CRITICAL FIX: Use line number as VSI number for specific lines
-            lines.append(f"UserVSI-{line_num} = VLAN={user_vlan}, PBIT={user_pbit}")
-            lines.append(f"UserVSI-{line_num} Parent = Line{line_num}")
+            vsi.add_user(line_num, user_vlan, user_pbit, line_num)
         
         # Generate NetworkVSI
         if forwarder_type == '1:1':
@@ -1005,13 +2409,12 @@ class IntelligentConfigGenerator:
                 else:
                     network_pbit = self._get_network_pbit(entities, i)
                 
-                lines.append(f"NetworkVSI-{line_num} = VLAN={network_vlan}, PBIT={network_pbit}")
-                lines.append(f"NetworkVSI-{line_num} Parent = Uplink{entities['uplinks'][0]}")
-                lines.append(f"Forwarder-{line_num} 1:1")
+                vsi.add_network(line_num, network_vlan, network_pbit, entities['uplinks'][0])
+                vsi.add_forwarder('1:1', number=line_num)
         
-        return "\n".join(lines)
+        return vsi
 
-    def _generate_single_line_config_fixed(self, entities: Dict, lines: List[str]) -> str:
+    def _generate_single_line_config_fixed(self, entities: Dict, vsi: VSIConfiguration) -> VSIConfiguration:
         """FIXED: Generate single line configuration"""
         line_num = entities['lines'][0] if entities['lines'] else 1
         forwarder_type = entities['forwarder_type']
@@ -1023,17 +2426,15 @@ class IntelligentConfigGenerator:
         network_pbit = self._get_network_pbit(entities, 0)
         
         # UserVSI
-        lines.append(f"UserVSI-1 = VLAN={user_vlan}, PBIT={user_pbit}")
-        lines.append(f"UserVSI-1 Parent = Line{line_num}")
+        vsi.add_user(1, user_vlan, user_pbit, line_num)
         
         # NetworkVSI
-        lines.append(f"NetworkVSI-1 = VLAN={network_vlan}, PBIT={network_pbit}")
-        lines.append(f"NetworkVSI-1 Parent = Uplink{entities['uplinks'][0]}")
+        vsi.add_network(1, network_vlan, network_pbit, entities['uplinks'][0])
         
         # Forwarder
-        lines.append(f"Forwarder = {forwarder_type}")
+        vsi.add_forwarder(forwarder_type, assign=True)
         
-        return "\n".join(lines)
+        return vsi
 
     def _get_user_vlan_fixed(self, entities: Dict, index: int, line_num: int) -> str:
         """CRITICAL FIX: Get user VLAN with intelligent defaults and explicit VLAN support"""
@@ -1110,9 +2511,12 @@ class IntelligentConfigGenerator:
         # CRITICAL FIX: Use extracted network VLANs first (explicit mentions)
         if entities['network_vlans']:
             if len(entities['network_vlans']) > 1 and forwarder_type == '1:1':
-                line_index = entities['lines'].index(line_num) if line_num in entities['lines'] else 0
-                if line_index < len(entities['network_vlans']):
-                    return entities['network_vlans'][line_index]
+                # Only the first len(network_vlans) lines have their own VLAN; bounding
+                # the search keeps this O(1) per line on large chassis
+                try:
+                    return entities['network_vlans'][entities['lines'].index(line_num, 0, len(entities['network_vlans']))]
+                except ValueError:
+                    pass
             return entities['network_vlans'][0]
         
         # CRITICAL FIX: For explicit same VLAN cases, use user VLAN
@@ -1189,382 +2593,651 @@ class IntelligentConfigGenerator:
         
         return "0"
 
-    def _generate_traffic_configuration(self, entities: Dict, vsi_config: str) -> str:
-        """Generate traffic configuration with ULTIMATE fixes"""
-        lines = []
-        target_lines = entities['lines']
-        is_multi_line = len(target_lines) > 1
-        is_multi_service = entities.get('is_multi_service', False)
-        
-        # Parse VSI config to understand VLAN mappings
-        vsi_mappings = self._parse_vsi_configuration(vsi_config)
-        
-        # Upstream traffic
-        lines.extend(self._generate_upstream_traffic_fixed(entities, target_lines, is_multi_line, vsi_mappings, is_multi_service))
-        
-        # Downstream traffic
-        lines.extend(self._generate_downstream_traffic_fixed(entities, target_lines, is_multi_line, vsi_mappings, is_multi_service))
-        
-        return "\n".join(lines)
+    def _generate_traffic_configuration(self, entities: Dict, vsi: VSIConfiguration) -> TrafficConfiguration:
+        """Generate traffic configuration with ULTIMATE fixes.
 
-    def _parse_vsi_configuration(self, vsi_config: str) -> Dict:
-        """Parse VSI configuration to extract mappings"""
-        mappings = {
-            'user_vlans': {},
-            'network_vlans': {},
-            'line_to_user_vsi': {},
-            'forwarder_map': {},
-        }
-        
-        lines = vsi_config.split('\n')
-        for line in lines:
-            line = line.strip()
-            # Parse UserVSI
-            if line.startswith('UserVSI-'):
-                match = re.search(r'UserVSI-(\d+)\s*=\s*VLAN=([^,]+),\s*PBIT=(\w+)', line)
-                if match:
-                    vsi_num = int(match.group(1))
-                    vlan = match.group(2)
-                    pbit = match.group(3)
-                    mappings['user_vlans'][vsi_num] = {'vlan': vlan, 'pbit': pbit}
-            
-            elif line.startswith('UserVSI-') and 'Parent' in line:
-                match = re.search(r'UserVSI-(\d+)\s*Parent\s*=\s*Line(\d+)', line)
-                if match:
-                    vsi_num = int(match.group(1))
-                    line_num = int(match.group(2))
-                    mappings['line_to_user_vsi'][line_num] = vsi_num
+        One row per line (per service for multi-service prompts) holds the
+        MAC pair and both sides' VLAN/PBIT; all four blocks of both
+        directions are emitted from those rows, swapping MACs downstream.
+        """
+        traffic = TrafficConfiguration()
+        for heading, packets in self._traffic_blocks(entities, vsi):
+            traffic.add_block(*heading).extend(packets)
+        return traffic
+
+    def _traffic_blocks(self, entities: Dict, vsi: VSIConfiguration) -> List[Tuple[Tuple[str, ...], Iterator[PacketSpec]]]:
+        """(heading lines, lazy packets) per traffic block.
+
+        The rows are computed here, so errors surface before anything is
+        streamed; the packets themselves are only produced while the
+        block is iterated, which keeps streamed traffic off the heap.
+        """
+        headers = self._protocol_headers(entities)
+        untagged = entities['is_untagged']
+        
+        if entities.get('is_multi_service', False):
+            # Every line sends the same packet per service: render each body
+            # once per block and pair it with each line's heading
+            rows = self._service_traffic_rows(entities, vsi)
+            line_headings = [self.packet_headers.heading(line_num) for line_num in entities['lines']]
             
-            # Parse NetworkVSI
-            elif line.startswith('NetworkVSI-'):
-                match = re.search(r'NetworkVSI-(\d+)\s*=\s*VLAN=([^,]+),\s*PBIT=(\w+)', line)
-                if match:
-                    vsi_num = int(match.group(1))
-                    vlan = match.group(2)
-                    pbit = match.group(3)
-                    mappings['network_vlans'][vsi_num] = {'vlan': vlan, 'pbit': pbit}
-        
-        return mappings
-
-    def _generate_upstream_traffic_fixed(self, entities: Dict, target_lines: List[int], is_multi_line: bool, vsi_mappings: Dict, is_multi_service: bool) -> List[str]:
-        """FIXED: Generate upstream traffic configuration"""
-        lines = [
-            "Test Eqpt - Upstream",
-            "Entity2 = User Side Traffic Eqpt",
-            "Entity2 Keywords=",
-            "NumPackets To Generate = 100"
-        ]
-        
-        # Handle multi-service traffic generation
-        if is_multi_service:
-            service_count = entities.get('service_count', 1)
-            for line_num in target_lines:
-                for service_num in range(1, service_count + 1):
-                    # Get VLAN from VSI mappings
-                    if service_num in vsi_mappings['user_vlans']:
-                        user_info = vsi_mappings['user_vlans'][service_num]
-                        user_vlan = user_info['vlan']
-                        user_pbit = user_info['pbit']
-                    else:
-                        user_vlan = str(101 + service_num - 1)
-                        user_pbit = "0"
-                    
-                    # Generate packet header
-                    src_mac = f"99:02:03:04:{service_num:02d}:11"
-                    dst_mac = f"98:0A:0B:0C:{service_num:02d}:0C"
-                    
-                    lines.append(f"Packet Line{line_num} L2 Header")
-                    lines.append(f"Src MAC = {src_mac}")
-                    lines.append(f"Dst MAC = {dst_mac}")
-                    lines.append(f"VLAN = {user_vlan}, PBIT = {user_pbit}")
-                    
-                    # Add protocol headers
-                    for protocol in entities['protocols']:
-                        if protocol == 'IPv6':
-                            lines.append("L3 Header = Ipv6")
-                        elif protocol == 'PPPoE':
-                            lines.append("Next Header = PPPoE")
-        
+            def packets(side: str, downstream: bool) -> Iterator[PacketSpec]:
+                # Multi-service upstream packets are always sent tagged
+                bodies = [self._packet_body(row, side, downstream, untagged and side == 'user' and downstream, headers)
+                          for row in rows]
+                return (PacketSpec(heading, body) for heading in line_headings for body in bodies)
         else:
-            # Regular traffic generation
-            for i, line_num in enumerate(target_lines):
-                user_vsi_num = vsi_mappings['line_to_user_vsi'].get(line_num, i + 1)
-                if user_vsi_num in vsi_mappings['user_vlans']:
-                    user_vlan = vsi_mappings['user_vlans'][user_vsi_num]['vlan']
-                    user_pbit = vsi_mappings['user_vlans'][user_vsi_num]['pbit']
-                else:
-                    user_vlan = self._get_user_vlan_fixed(entities, i, line_num)
-                    user_pbit = self._get_user_pbit(entities, i)
-                
-                # Generate packet header
-                if is_multi_line:
-                    src_mac = f"99:02:03:04:{line_num:02d}:11" if not entities.get('specific_lines') else f"99:02:03:04:{line_num}:11"
-                    dst_mac = f"98:0A:0B:0C:{line_num:02d}:0C" if not entities.get('specific_lines') else f"98:0A:0B:0C:{line_num}:0C"
-                    lines.append(f"Packet Line{line_num} L2 Header")
-                else:
-                    src_mac = "99:02:03:04:05:06"
-                    dst_mac = "98:0A:0B:0C:0D:0E"
-                    lines.append("Packet L2 Header")
-                
-                lines.append(f"Src MAC = {src_mac}")
-                lines.append(f"Dst MAC = {dst_mac}")
-                
-                # Handle untagged packets
-                if entities['is_untagged']:
-                    lines.append("VLAN=No, PBIT=No")
-                else:
-                    lines.append(f"VLAN = {user_vlan}, PBIT = {user_pbit}")
-                
-                # Add protocol headers
-                for protocol in entities['protocols']:
-                    if protocol == 'IPv6':
-                        lines.append("L3 Header = Ipv6")
-                    elif protocol == 'PPPoE':
-                        lines.append("Next Header = PPPoE")
-        
-        # Network side reception
-        lines.extend([
-            "Entity3 = Network Side Traffic Eqpt",
-            "Entity3 Keywords=",
-            "NumPackets To Recieve = 100"
-        ])
-        
-        # Generate network reception packets
-        if is_multi_service:
-            service_count = entities.get('service_count', 1)
-            for line_num in target_lines:
-                for service_num in range(1, service_count + 1):
-                    # Get network VLAN from VSI mappings
-                    if service_num in vsi_mappings['network_vlans']:
-                        network_info = vsi_mappings['network_vlans'][service_num]
-                        network_vlan = network_info['vlan']
-                        network_pbit = network_info['pbit']
-                    else:
-                        network_vlan = str(101 + service_num - 1)
-                        network_pbit = "0"
-                    
-                    src_mac = f"99:02:03:04:{service_num:02d}:11"
-                    dst_mac = f"98:0A:0B:0C:{service_num:02d}:0C"
-                    
-                    lines.append(f"Packet Line{line_num} L2 Header")
-                    lines.append(f"Src MAC = {src_mac}")
-                    lines.append(f"Dst MAC = {dst_mac}")
-                    lines.append(f"VLAN = {network_vlan}, PBIT = {network_pbit}")
-                    
-                    # Add protocol headers
-                    for protocol in entities['protocols']:
-                        if protocol == 'IPv6':
-                            lines.append("L3 Header = Ipv6")
-                        elif protocol == 'PPPoE':
-                            lines.append("Next Header = PPPoE")
-        
-        else:
-            # Regular network reception
-            for i, line_num in enumerate(target_lines):
-                network_vlan, network_pbit = self._get_network_traffic_vlan_pbit_fixed(
-                    entities, line_num, i, vsi_mappings
-                )
-                
-                if is_multi_line:
-                    src_mac = f"99:02:03:04:{line_num:02d}:11" if not entities.get('specific_lines') else f"99:02:03:04:{line_num}:11"
-                    dst_mac = f"98:0A:0B:0C:{line_num:02d}:0C" if not entities.get('specific_lines') else f"98:0A:0B:0C:{line_num}:0C"
-                    lines.append(f"Packet Line{line_num} L2 Header")
-                else:
-                    src_mac = "99:02:03:04:05:06"
-                    dst_mac = "98:0A:0B:0C:0D:0E"
-                    lines.append("Packet L2 Header")
-                
-                lines.append(f"Src MAC = {src_mac}")
-                lines.append(f"Dst MAC = {dst_mac}")
-                lines.append(f"VLAN = {network_vlan}, PBIT = {network_pbit}")
-                
-                # Add protocol headers
-                for protocol in entities['protocols']:
-                    if protocol == 'IPv6':
-                        lines.append("L3 Header = Ipv6")
-                    elif protocol == 'PPPoE':
-                        lines.append("Next Header = PPPoE")
-        
-        return lines
-
-    def _generate_downstream_traffic_fixed(self, entities: Dict, target_lines: List[int], is_multi_line: bool, vsi_mappings: Dict, is_multi_service: bool) -> List[str]:
-        """FIXED: Generate downstream traffic configuration"""
-        lines = [
-            "Test Eqpt - Downstream",
-            "Entity3 = Network Side Traffic Eqpt",
-            "Entity3 Keywords=",
-            "NumPackets To Generate = 100"
-        ]
-        
-        # Handle multi-service downstream traffic
-        if is_multi_service:
-            service_count = entities.get('service_count', 1)
-            for line_num in target_lines:
-                for service_num in range(1, service_count + 1):
-                    # Get network VLAN from VSI mappings (reversed MACs)
-                    if service_num in vsi_mappings['network_vlans']:
-                        network_info = vsi_mappings['network_vlans'][service_num]
-                        network_vlan = network_info['vlan']
-                        network_pbit = network_info['pbit']
-                    else:
-                        network_vlan = str(101 + service_num - 1)
-                        network_pbit = "0"
-                    
-                    src_mac = f"98:0A:0B:0C:{service_num:02d}:0C"  # Reversed
-                    dst_mac = f"99:02:03:04:{service_num:02d}:11"  # Reversed
-                    
-                    lines.append(f"Packet Line{line_num} L2 Header")
-                    lines.append(f"Src MAC = {src_mac}")
-                    lines.append(f"Dst MAC = {dst_mac}")
-                    lines.append(f"VLAN = {network_vlan}, PBIT = {network_pbit}")
-                    
-                    # Add protocol headers
-                    for protocol in entities['protocols']:
-                        if protocol == 'IPv6':
-                            lines.append("L3 Header = Ipv6")
-                        elif protocol == 'PPPoE':
-                            lines.append("Next Header = PPPoE")
-        
-        else:
-            # Regular downstream generation
-            for i, line_num in enumerate(target_lines):
-                network_vlan, network_pbit = self._get_network_traffic_vlan_pbit_fixed(
-                    entities, line_num, i, vsi_mappings
-                )
-                
-                if is_multi_line:
-                    src_mac = f"98:0A:0B:0C:{line_num:02d}:0C" if not entities.get('specific_lines') else f"98:0A:0B:0C:{line_num}:0C"
-                    dst_mac = f"99:02:03:04:{line_num:02d}:11" if not entities.get('specific_lines') else f"99:02:03:04:{line_num}:11"
-                    lines.append(f"Packet Line{line_num} L2 Header")
-                else:
-                    src_mac = "98:0A:0B:0C:0D:0E"
-                    dst_mac = "99:02:03:04:05:06"
-                    lines.append("Packet L2 Header")
-                
-                lines.append(f"Src MAC = {src_mac}")
-                lines.append(f"Dst MAC = {dst_mac}")
-                lines.append(f"VLAN = {network_vlan}, PBIT = {network_pbit}")
-                
-                # Add protocol headers
-                for protocol in entities['protocols']:
-                    if protocol == 'IPv6':
-                        lines.append("L3 Header = Ipv6")
-                    elif protocol == 'PPPoE':
-                        lines.append("Next Header = PPPoE")
-        
-        # User side reception
-        lines.extend([
-            "Entity2 = User Side Traffic Eqpt",
-            "Entity2 Keywords=",
-            "NumPackets To Recieve = 100"
-        ])
-        
-        # Generate user reception packets
-        if is_multi_service:
-            service_count = entities.get('service_count', 1)
-            for line_num in target_lines:
-                for service_num in range(1, service_count + 1):
-                    # Get user VLAN from VSI mappings
-                    if service_num in vsi_mappings['user_vlans']:
-                        user_info = vsi_mappings['user_vlans'][service_num]
-                        user_vlan = user_info['vlan']
-                        user_pbit = user_info['pbit']
-                    else:
-                        user_vlan = str(101 + service_num - 1)
-                        user_pbit = "0"
-                    
-                    src_mac = f"98:0A:0B:0C:{service_num:02d}:0C"  # Reversed
-                    dst_mac = f"99:02:03:04:{service_num:02d}:11"  # Reversed
-                    
-                    lines.append(f"Packet Line{line_num} L2 Header")
-                    lines.append(f"Src MAC = {src_mac}")
-                    lines.append(f"Dst MAC = {dst_mac}")
-                    
-                    # Handle untagged packets
-                    if entities['is_untagged']:
-                        lines.append("VLAN=No, PBIT=No")
-                    else:
-                        lines.append(f"VLAN = {user_vlan}, PBIT = {user_pbit}")
-                    
-                    # Add protocol headers
-                    for protocol in entities['protocols']:
-                        if protocol == 'IPv6':
-                            lines.append("L3 Header = Ipv6")
-                        elif protocol == 'PPPoE':
-                            lines.append("Next Header = PPPoE")
-        
-        else:
-            # Regular user reception
-            for i, line_num in enumerate(target_lines):
-                user_vsi_num = vsi_mappings['line_to_user_vsi'].get(line_num, i + 1)
-                if user_vsi_num in vsi_mappings['user_vlans']:
-                    user_vlan = vsi_mappings['user_vlans'][user_vsi_num]['vlan']
-                    user_pbit = vsi_mappings['user_vlans'][user_vsi_num]['pbit']
-                else:
-                    user_vlan = self._get_user_vlan_fixed(entities, i, line_num)
-                    user_pbit = self._get_user_pbit(entities, i)
-                
-                if is_multi_line:
-                    src_mac = f"98:0A:0B:0C:{line_num:02d}:0C" if not entities.get('specific_lines') else f"98:0A:0B:0C:{line_num}:0C"
-                    dst_mac = f"99:02:03:04:{line_num:02d}:11" if not entities.get('specific_lines') else f"99:02:03:04:{line_num}:11"
-                    lines.append(f"Packet Line{line_num} L2 Header")
-                else:
-                    src_mac = "98:0A:0B:0C:0D:0E"
-                    dst_mac = "99:02:03:04:05:06"
-                    lines.append("Packet L2 Header")
-                
-                lines.append(f"Src MAC = {src_mac}")
-                lines.append(f"Dst MAC = {dst_mac}")
-                
-                # Handle untagged packets
-                if entities['is_untagged']:
-                    lines.append("VLAN=No, PBIT=No")
-                else:
-                    lines.append(f"VLAN = {user_vlan}, PBIT = {user_pbit}")
-                
-                # Add protocol headers
-                for protocol in entities['protocols']:
-                    if protocol == 'IPv6':
-                        lines.append("L3 Header = Ipv6")
-                    elif protocol == 'PPPoE':
-                        lines.append("Next Header = PPPoE")
+            rows = self._line_traffic_rows(entities, vsi)
+            
+            def packets(side: str, downstream: bool) -> Iterator[PacketSpec]:
+                return (PacketSpec(row[0], self._packet_body(row, side, downstream, untagged and side == 'user', headers))
+                        for row in rows)
         
-        return lines
+        return [(block_heading, packets(side, downstream)) for block_heading, side, downstream in self.TRAFFIC_BLOCKS]
+
+    def _line_traffic_rows(self, entities: Dict, vsi: VSIConfiguration) -> List[Tuple[str, str, str, Tuple[str, str], Tuple[str, str]]]:
+        """(heading, user MAC, network MAC, user VLAN/PBIT, network VLAN/PBIT) per target line"""
+        target_lines = entities['lines']
+        is_multi_line = len(target_lines) > 1
+        pad = not entities.get('specific_lines')
+        rows = []
+        for i, line_num in enumerate(target_lines):
+            if is_multi_line:
+                heading = self.packet_headers.heading(line_num)
+                user_mac, network_mac = self.packet_headers.line_macs(line_num, pad)
+            else:
+                heading = PacketHeaderTable.SINGLE_LINE_HEADING
+                user_mac, network_mac = PacketHeaderTable.SINGLE_LINE_MACS
+            rows.append((heading, user_mac, network_mac,
+                         self._line_user_vlan_pbit(entities, vsi, i, line_num),
+                         self._get_network_traffic_vlan_pbit_fixed(entities, line_num, i, vsi)))
+        return rows
+
+    def _service_traffic_rows(self, entities: Dict, vsi: VSIConfiguration) -> List[Tuple[None, str, str, Tuple[str, str], Tuple[str, str]]]:
+        """Rows like _line_traffic_rows() but per service; headings come from the lines"""
+        rows = []
+        for service_num in range(1, entities.get('service_count', 1) + 1):
+            user_mac, network_mac = self.packet_headers.service_macs(service_num)
+            rows.append((None, user_mac, network_mac,
+                         self._service_user_vlan_pbit(vsi, service_num),
+                         self._service_network_vlan_pbit(vsi, service_num)))
+        return rows
+
+    @staticmethod
+    def _packet_body(row: Tuple, side: str, downstream: bool, untagged: bool, headers: Tuple[str, ...]) -> str:
+        _, user_mac, network_mac, user_vlan_pbit, network_vlan_pbit = row
+        src_mac, dst_mac = (network_mac, user_mac) if downstream else (user_mac, network_mac)
+        vlan, pbit = user_vlan_pbit if side == 'user' else network_vlan_pbit
+        return PacketHeaderTable.body(src_mac, dst_mac, vlan, pbit, untagged, headers)
+
+    def _protocol_headers(self, entities: Dict) -> Tuple[str, ...]:
+        """Extra packet header lines for the requested protocols"""
+        headers = []
+        for protocol in entities['protocols']:
+            if protocol == 'IPv6':
+                headers.append("L3 Header = Ipv6")
+            elif protocol == 'PPPoE':
+                headers.append("Next Header = PPPoE")
+        return tuple(headers)
 
-    def _get_network_traffic_vlan_pbit_fixed(self, entities: Dict, line_num: int, index: int, vsi_mappings: Dict) -> Tuple[str, str]:
+    def _service_user_vlan_pbit(self, vsi: VSIConfiguration, service_num: int) -> Tuple[str, str]:
+        """User VLAN/PBIT for a multi-service packet"""
+        if service_num in vsi.user_vsis:
+            user_vsi = vsi.user_vsis[service_num]
+            return str(user_vsi.vlan), user_vsi.traffic_pbit
+        return str(101 + service_num - 1), "0"
+
+    def _service_network_vlan_pbit(self, vsi: VSIConfiguration, service_num: int) -> Tuple[str, str]:
+        """Network VLAN/PBIT for a multi-service packet"""
+        if service_num in vsi.network_vsis:
+            network_vsi = vsi.network_vsis[service_num]
+            return str(network_vsi.vlan), network_vsi.traffic_pbit
+        return str(101 + service_num - 1), "0"
+
+    def _line_user_vlan_pbit(self, entities: Dict, vsi: VSIConfiguration, index: int, line_num: int) -> Tuple[str, str]:
+        """User VLAN/PBIT for the index-th target line (UserVSI-<index+1>)"""
+        user_vsi = vsi.user_vsis.get(index + 1)
+        if user_vsi is not None:
+            return str(user_vsi.vlan), user_vsi.traffic_pbit
+        return self._get_user_vlan_fixed(entities, index, line_num), self._get_user_pbit(entities, index)
+
+    def _get_network_traffic_vlan_pbit_fixed(self, entities: Dict, line_num: int, index: int, vsi: VSIConfiguration) -> Tuple[str, str]:
         """FIXED: Get network VLAN and PBIT for traffic generation"""
+        network_vsis = vsi.network_vsis
+        
         # Check if we have discretization
         if entities.get('line_forwarder_map'):
             forwarder_type = entities['line_forwarder_map'].get(line_num)
             if forwarder_type == '1:1':
-                if line_num in vsi_mappings['network_vlans']:
-                    network_info = vsi_mappings['network_vlans'][line_num]
-                    return network_info['vlan'], network_info['pbit']
+                if line_num in network_vsis:
+                    return str(network_vsis[line_num].vlan), network_vsis[line_num].traffic_pbit
                 else:
                     return str(1000 + line_num), "0"
             else:  # N:1
-                for vsi_num, network_info in vsi_mappings['network_vlans'].items():
-                    if vsi_num == 1:
-                        return network_info['vlan'], network_info['pbit']
+                if 1 in network_vsis:
+                    return str(network_vsis[1].vlan), network_vsis[1].traffic_pbit
                 return "1000", "0"
         
         # Default logic for non-discretized scenarios
         if entities['forwarder_type'] == '1:1':
             vsi_num = index + 1
-            if vsi_num in vsi_mappings['network_vlans']:
-                network_info = vsi_mappings['network_vlans'][vsi_num]
-                return network_info['vlan'], network_info['pbit']
+            if vsi_num in network_vsis:
+                return str(network_vsis[vsi_num].vlan), network_vsis[vsi_num].traffic_pbit
             return str(1000 + line_num), "0"
         else:
             # N:1 - use NetworkVSI-1
-            if 1 in vsi_mappings['network_vlans']:
-                network_info = vsi_mappings['network_vlans'][1]
-                return network_info['vlan'], network_info['pbit']
+            if 1 in network_vsis:
+                return str(network_vsis[1].vlan), network_vsis[1].traffic_pbit
             return "1000", "0"
 
-print("✓ ULTIMATE FIXED Enhanced Intelligent Configuration Generator defined")
+log.info("✓ ULTIMATE FIXED Enhanced Intelligent Configuration Generator defined")
+
+
+# Cell 4: Process-wide Generator Engine (built once per worker)
+class ResponseCache:
+    """LRU cache of rendered configurations bounded by memory, not entry count.
+
+    Multi-service and all-lines configurations are far larger than
+    single-line ones, so the bound is on the bytes held by the cached
+    strings (sys.getsizeof). Entries larger than the whole budget are
+    never stored.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024):
+        self.max_bytes = max_bytes  # 0 disables caching
+        self._entries = OrderedDict()  # key -> ((vsi, traffic, VLAN conflicts), size)
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.oversized = 0
+
+    @staticmethod
+    def _sizeof(key: Tuple[str, bool], sections: Tuple[str, Optional[str], List[Dict[str, Any]]]) -> int:
+        return sys.getsizeof(key[0]) + sum(sys.getsizeof(section) for section in sections[:2] if section is not None)
+
+    def get(self, key: Tuple[str, bool]) -> Optional[Tuple[str, Optional[str], List[Dict[str, Any]]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Tuple[str, bool], sections: Tuple[str, Optional[str], List[Dict[str, Any]]]):
+        size = self._sizeof(key, sections)
+        if size > self.max_bytes:
+            self.oversized += 1
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= previous[1]
+            self._entries[key] = (sections, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'oversized': self.oversized,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
+
+
+class GeneratorEngine:
+    """Process-wide owner of the shared IntelligentConfigGenerator.
+
+    Building the generator compiles every pattern table (and the spaCy
+    Matcher with SPACY_MODE=eager), so it is done once per process
+    instead of once per request.
+    The extractor and generator keep no per-request state, which lets all
+    request threads share a single instance.
+
+    Lifecycle:
+        build()  - construct the generator. Runs at import time, so each
+                   gunicorn worker is ready before it accepts traffic
+                   (with --preload the master builds it and workers
+                   inherit it on fork).
+        warm()   - run WARMUP_PROMPTS through the full pipeline so the
+                   first real request doesn't pay for regex compilation
+                   and other lazy setup. Controlled by ENGINE_WARMUP.
+        reload() - build and warm a fresh generator, then swap it in.
+                   Requests already running keep the instance they
+                   started with. The response cache is cleared.
+
+    generate() serves repeat prompts from a response cache keyed on
+    (normalized text, minimal), skipping VSI and traffic rendering.
+    """
+
+    WARMUP_PROMPTS = [
+        "Configure DUT with User Side VSI with VLAN 100 on Line1 and PBIT 5",
+        "Configure DUT for a Service with N:1 Forwarder for all Lines",
+        "Configure DUT for a service with 1:1 Forwarder for first 8 lines and N:1 Forwarder for remaining 8 lines",
+        "Create three 1:1 services for line 1 and use different pbit for each service",
+        "Configure DUT for N:1 service for line 1 and line 2 and validate v6 traffic",
+    ]
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generator = None
+        self.built_at = None
+        self.build_seconds = 0.0
+        self.response_cache = ResponseCache(
+            max_bytes=int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 32 * 1024 * 1024)),
+        )
+
+    @property
+    def generator(self) -> 'IntelligentConfigGenerator':
+        """Shared generator, built on first access if build() wasn't called"""
+        generator = self._generator
+        if generator is None:
+            generator = self.build()
+        return generator
+
+    @property
+    def entity_extractor(self) -> AdvancedNLPEntityExtractor:
+        return self.generator.entity_extractor
+
+    def build(self) -> 'IntelligentConfigGenerator':
+        """Build the shared generator once; later calls return the same instance"""
+        with self._lock:
+            if self._generator is None:
+                self._generator = self._create()
+            return self._generator
+
+    def generate(self, input_text: str, minimal: bool = False, entities: Optional[Dict[str, Any]] = None) -> GenerationResult:
+        """Generate through the response cache"""
+        generator = self.generator
+        key = (generator.entity_extractor._preprocess_text(input_text), bool(minimal))
+        sections = self.response_cache.get(key)
+        if sections is not None:
+            if entities is None:
+                started = time.perf_counter()
+                entities = generator.entity_extractor.extract_comprehensive_entities(input_text)
+                observe_stage(time.perf_counter() - started, 'extract', vsi_scenario(entities))
+            return GenerationResult(entities, *sections)
+        
+        result = generator.generate(input_text, minimal=minimal, entities=entities)
+        self.response_cache.put(key, (result.vsi_config, result.traffic_config, result.vlan_conflicts))
+        return result
+
+    def generate_stream(self, input_text: str, minimal: bool = False) -> Tuple[List[Dict[str, Any]], Iterator[str]]:
+        """VLAN conflicts and the configuration text as chunks; served from the response cache when present.
+
+        Streamed results are not cached, since that would hold the whole
+        text in memory.
+        """
+        generator = self.generator
+        key = (generator.entity_extractor._preprocess_text(input_text), bool(minimal))
+        sections = self.response_cache.get(key)
+        if sections is not None:
+            vsi_config, traffic_config, vlan_conflicts = sections
+            return vlan_conflicts, iter_text_chunks(section for section in (vsi_config, traffic_config) if section is not None)
+        result, chunks = generator.generate_stream(input_text, minimal=minimal)
+        return result.vlan_conflicts, chunks
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return {
+            'entity_cache': self.entity_extractor.entity_cache.stats(),
+            'response_cache': self.response_cache.stats(),
+        }
+
+    def warm(self, generator: Optional['IntelligentConfigGenerator'] = None):
+        """Exercise every generation branch once before serving traffic; records no stage metrics"""
+        generator = generator or self.generator
+        _stage_capture.muted = True
+        try:
+            for prompt in self.WARMUP_PROMPTS:
+                generator.generate(prompt, minimal=False)
+        finally:
+            _stage_capture.muted = False
+
+    def reload(self) -> 'IntelligentConfigGenerator':
+        """Rebuild the generator (e.g. after pattern changes) and swap it in"""
+        generator = self._create()
+        with self._lock:
+            self._generator = generator
+            self.response_cache.clear()
+        return generator
+
+    def _create(self) -> 'IntelligentConfigGenerator':
+        started = datetime.now()
+        generator = IntelligentConfigGenerator()
+        if os.environ.get('ENGINE_WARMUP', '1') != '0':
+            self.warm(generator)
+        self.built_at = datetime.now()
+        self.build_seconds = (self.built_at - started).total_seconds()
+        return generator
+
+
+engine = GeneratorEngine()
+engine.build()
+log.info("✓ Generator engine built in %.1f ms", engine.build_seconds * 1000,
+         extra={'engine_build_ms': round(engine.build_seconds * 1000, 1)})
+
+STARTUP_SECONDS = time.perf_counter() - _IMPORT_STARTED
+if STARTUP_SECONDS * 1000 > STARTUP_BUDGET_MS:
+    log.warning("⚠ Startup took %.0f ms, over the %.0f ms budget", STARTUP_SECONDS * 1000, STARTUP_BUDGET_MS,
+                extra={'startup_ms': round(STARTUP_SECONDS * 1000, 1)})
+
+
+# Cell 5: Parallel Batch Generation
+def _generate_batch_item(item: Tuple[int, str, bool], entities: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Generate one batch item with this process's shared engine.
+
+    Failures are returned as per-item errors instead of being raised.
+    """
+    index, input_text, minimal = item
+    try:
+        result = engine.generate(input_text, minimal=minimal, entities=entities)
+        return {'index': index, 'success': True, **result.to_dict(), 'input_text': input_text}
+    except Exception as e:
+        return {'index': index, 'success': False, 'error': str(e), 'input_text': input_text}
+
+
+def _generate_batch_chunk(chunk: List[Tuple[int, str, bool]], n_process: int = 1,
+                          report_stages: bool = False) -> List[Dict[str, Any]]:
+    """Pool task: a few batch items per round trip.
+
+    With spaCy enabled the whole chunk is tokenized in one nlp.pipe call
+    (n_process > 1 only when running inline; pool workers are already
+    parallel). Runs inside pool workers (which inherit or rebuild
+    `engine`), so it must stay a picklable module-level function.
+    report_stages adds each item's (seconds, stage, scenario) timings as
+    'stage_seconds' for the parent to record.
+    """
+    extractor = engine.entity_extractor
+    entities_list = [None] * len(chunk)
+    if extractor.uses_matcher:
+        try:
+            entities_list = extractor.extract_entities_batch([text for _, text, _ in chunk], n_process=n_process)
+        except Exception:
+            pass  # fall back to per-item extraction so errors stay per item
+    if not report_stages:
+        return [_generate_batch_item(item, entities) for item, entities in zip(chunk, entities_list)]
+    
+    results = []
+    for item, entities in zip(chunk, entities_list):
+        _stage_capture.stages = []
+        try:
+            result = _generate_batch_item(item, entities)
+        finally:
+            stages, _stage_capture.stages = _stage_capture.stages, None
+        result['stage_seconds'] = stages
+        results.append(result)
+    return results
+
+
+class BatchExecutor:
+    """Process pool for /api/generate/batch, created on first use.
+
+    Sized to the host's cores unless BATCH_WORKERS is set; with a single
+    worker items run inline in the request process. Workers are started
+    with forkserver (spawn where unavailable) rather than fork, because
+    the pool is created from a threaded request handler and forking a
+    multi-threaded process can deadlock the child. At most a few chunks
+    per worker are in flight, so memory stays flat however large the
+    batch and results can be consumed as they finish.
+    """
+
+    CHUNKS_IN_FLIGHT_PER_WORKER = 2
+
+    def __init__(self, max_workers: Optional[int] = None, chunksize: int = 4,
+                 start_method: Optional[str] = None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.chunksize = max(1, chunksize)
+        if start_method is None:
+            start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        self.start_method = start_method
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                 mp_context=multiprocessing.get_context(self.start_method))
+            return self._pool
+
+    def iter_results(self, items: Iterable[Tuple[int, str, bool]], ordered: bool = True) -> Iterator[Dict[str, Any]]:
+        """Yield a result per (index, input_text, minimal) item.
+
+        items may be any iterable (e.g. rows streamed from a sheet); it is
+        consumed lazily, only as far ahead as the in-flight window.
+        ordered=True yields in input order; ordered=False yields each
+        result as soon as its chunk completes.
+        """
+        remaining = iter(items)
+        chunks = iter(lambda: list(itertools.islice(remaining, self.chunksize)), [])
+        
+        if self.max_workers <= 1 or (isinstance(items, list) and len(items) <= 1):
+            for chunk in chunks:
+                yield from _generate_batch_chunk(chunk, n_process=SPACY_N_PROCESS)
+            return
+        
+        pool = self._get_pool()
+        window = self.max_workers * self.CHUNKS_IN_FLIGHT_PER_WORKER
+        pending = deque()
+        try:
+            for chunk in chunks:
+                pending.append(pool.submit(_generate_batch_chunk, chunk, 1, True))
+                if len(pending) >= window:
+                    yield from self._drain(pending, ordered)
+            while pending:
+                yield from self._drain(pending, ordered)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed); start a fresh pool next time
+            self.shutdown()
+            raise
+        finally:
+            # Client went away or a worker failed: drop work nobody will read
+            for future in pending:
+                future.cancel()
+
+    @classmethod
+    def _drain(cls, pending: deque, ordered: bool) -> Iterator[Dict[str, Any]]:
+        """Yield the results of at least one finished chunk and drop it from pending"""
+        if ordered:
+            yield from cls._record_stages(pending.popleft().result())
+            return
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            pending.remove(future)
+            yield from cls._record_stages(future.result())
+    
+    @staticmethod
+    def _record_stages(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Observe the stage timings pool workers sent back, in this process's registry"""
+        for result in results:
+            for seconds, stage, scenario in result.pop('stage_seconds', ()):
+                STAGE_SECONDS.observe(seconds, stage, scenario)
+        return results
+
+    def run(self, items: List[Tuple[int, str, bool]]) -> List[Dict[str, Any]]:
+        """Generate every item and return the results in input order"""
+        return list(self.iter_results(items, ordered=True))
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _default_batch_workers() -> int:
+    """Cores shared out across the WEB_CONCURRENCY web workers of the host"""
+    return max(1, (os.cpu_count() or 1) // max(1, int(os.environ.get('WEB_CONCURRENCY', 1))))
+
+
+batch_executor = BatchExecutor(
+    max_workers=int(os.environ.get('BATCH_WORKERS', 0)) or _default_batch_workers(),
+    chunksize=int(os.environ.get('BATCH_CHUNK_SIZE', 4)),
+    start_method=os.environ.get('BATCH_START_METHOD') or None,
+)
+atexit.register(batch_executor.shutdown)
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 10000))
+
+
+def _parse_batch_items(data: Dict) -> Tuple[List[Tuple[int, str, bool]], List[Dict[str, Any]]]:
+    """Split a batch request into runnable items and per-item validation errors.
+
+    Each entry of data['items'] is either a prompt string or an object with
+    'input_text' and an optional 'minimal' (defaulting to the top-level one).
+    """
+    default_minimal = bool(data.get('minimal', False))
+    items, errors = [], []
+    
+    for index, entry in enumerate(data['items']):
+        if isinstance(entry, str):
+            input_text, minimal = entry, default_minimal
+        elif isinstance(entry, dict):
+            input_text = entry.get('input_text', '')
+            minimal = bool(entry.get('minimal', default_minimal))
+        else:
+            errors.append({'index': index, 'success': False, 'error': 'Item must be a string or an object'})
+            continue
+        
+        if not isinstance(input_text, str) or not input_text.strip():
+            errors.append({'index': index, 'success': False, 'error': 'Input text is required'})
+            continue
+        
+        items.append((index, input_text, minimal))
+    
+    return items, errors
+
+
+def _iter_batch_results(items: List[Tuple[int, str, bool]], errors: List[Dict[str, Any]], ordered: bool) -> Iterator[Dict[str, Any]]:
+    """Interleave validation errors with generated results.
+
+    In input order both streams are already sorted by index and are merged
+    lazily; in completion order the errors (ready immediately) come first.
+    """
+    results = batch_executor.iter_results(items, ordered=ordered)
+    if ordered:
+        return heapq.merge(results, errors, key=lambda item: item['index'])
+    return itertools.chain(errors, results)
+
+def _error_response(message: str) -> Response:
+    """Failed API response; counted as an error in testit_requests_total"""
+    g.request_outcome = 'error'
+    return jsonify({
+        'success': False,
+        'error': message
+    })
+
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def _record_request(response: Response) -> Response:
+    """Count and time every routed request except scrapes of /metrics"""
+    METRICS.start_flushing()
+    rule = request.url_rule
+    if rule is not None and rule.rule != '/metrics' and 'request_started' in g:
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_started, rule.rule)
+        outcome = 'error' if response.status_code >= 400 else g.get('request_outcome', 'success')
+        REQUESTS_TOTAL.inc(rule.rule, outcome)
+    return response
 
-print("📚 Flask application with enhanced NLP entity extraction initialized")
+def _collect_cache_metrics():
+    for cache, stats in engine.cache_stats().items():
+        CACHE_LOOKUPS_TOTAL.set(stats['hits'], cache, 'hit')
+        CACHE_LOOKUPS_TOTAL.set(stats['misses'], cache, 'miss')
+        CACHE_HIT_RATIO.set(stats['hit_ratio'], cache)
+        CACHE_ENTRIES.set(stats['size'] if 'size' in stats else stats['entries'], cache)
+
+def _collect_prefilter_metrics():
+    stats = engine.entity_extractor.scanner.prefilter.stats()
+    PREFILTER_SCANS_TOTAL.set(stats['scans'])
+    for family, skipped in stats['skipped'].items():
+        PREFILTER_SKIPPED_TOTAL.set(skipped, family)
+
+CACHE_LOOKUPS_TOTAL = METRICS.register(Counter(
+    'testit_cache_lookups_total', "Cache lookups by cache and result (hit/miss)", ('cache', 'result')))
+CACHE_HIT_RATIO = METRICS.register(Gauge('testit_cache_hit_ratio', "Cache hit ratio since start", ('cache',)))
+CACHE_ENTRIES = METRICS.register(Gauge(
+    'testit_cache_entries', "Entries currently cached", ('cache',), multiprocess_mode='sum'))
+METRICS.add_collector(_collect_cache_metrics)
+PREFILTER_SCANS_TOTAL = METRICS.register(Counter(
+    'testit_prefilter_scans_total', "Prompts checked by the keyword prefilter"))
+PREFILTER_SKIPPED_TOTAL = METRICS.register(Counter(
+    'testit_prefilter_skipped_total', "Prompts for which a pattern family was skipped (no trigger word)", ('family',)))
+METRICS.add_collector(_collect_prefilter_metrics)
+
+# On-demand profiling: a request with "profile": true and a matching
+# X-Profile-Token header runs under cProfile. Unset PROFILE_TOKEN disables
+# it; cProfile is imported only when a profiled request arrives.
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN', '')
+PROFILE_TOP = int(os.environ.get('PROFILE_TOP', 25))
+_profile_lock = threading.Lock()  # one profiler at a time per process
+
+class ProfilerBusy(RuntimeError):
+    """Another request holds the profiler; answered with 409 Conflict"""
+
+def _profile_denied(data: Dict) -> Optional[str]:
+    """None when the request may be profiled, else why not"""
+    if not PROFILE_TOKEN:
+        return 'Profiling is disabled (PROFILE_TOKEN is not set)'
+    import hmac
+    if not hmac.compare_digest(request.headers.get('X-Profile-Token', ''), PROFILE_TOKEN):
+        return 'Invalid profiling token'
+    if data.get('stream'):
+        return 'Profiling is not supported for streamed responses'
+    return None
+
+def _profiled(func, *args, **kwargs) -> Tuple[Any, Dict[str, Any]]:
+    """Call func under cProfile; returns its result and the top functions by cumulative time"""
+    import cProfile
+    import pstats
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy('Another request is being profiled; retry when it finishes')
+    try:
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        result = profiler.runcall(func, *args, **kwargs)
+        elapsed = time.perf_counter() - started
+    finally:
+        _profile_lock.release()
+    
+    stats = pstats.Stats(profiler).stats  # (file, line, name) -> (prim calls, calls, tottime, cumtime, callers)
+    top = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:PROFILE_TOP]
+    return result, {
+        'total_ms': round(elapsed * 1000, 3),
+        'functions': [{
+            'function': name,
+            'file': os.path.basename(filename),
+            'line': line,
+            'calls': calls,
+            'tottime_ms': round(tottime * 1000, 3),
+            'cumtime_ms': round(cumtime * 1000, 3),
+        } for (filename, line, name), (_, calls, tottime, cumtime, _) in top],
+    }
+
+def _generate_uncached(generator: 'IntelligentConfigGenerator', input_text: str, minimal: bool) -> GenerationResult:
+    entities = generator.entity_extractor.extract_comprehensive_entities(input_text, use_cache=False)
+    return generator.generate(input_text, minimal=minimal, entities=entities)
+
+log.info("📚 Flask application with enhanced NLP entity extraction initialized")
 
 @app.route('/')
 def index():
@@ -1580,32 +3253,90 @@ def generate_configuration():
         minimal = data.get('minimal', False)
         
         if not input_text.strip():
-            return jsonify({
-                'success': False,
-                'error': 'Input text is required'
-            })
+            return _error_response('Input text is required')
+        
+        # Checked before streaming, which cannot be profiled
+        if data.get('profile'):
+            denied = _profile_denied(data)
+            if denied:
+                return _error_response(denied), 403
+        
+        # Large configurations: chunked text/plain instead of one JSON string
+        if data.get('stream', False):
+            vlan_conflicts, chunks = engine.generate_stream(input_text, minimal=minimal)
+            return Response(stream_with_context(chunks), mimetype='text/plain',
+                            headers={'X-VLAN-Conflicts': str(len(vlan_conflicts))})
+        
+        profile = None
+        if data.get('profile'):
+            # Bypass both caches so the whole pipeline is profiled
+            result, profile = _profiled(_generate_uncached, engine.generator, input_text, minimal)
+        else:
+            # Generate configuration with the shared engine (entities come from
+            # the same extraction pass; repeat prompts hit the response cache)
+            result = engine.generate(input_text, minimal=minimal)
         
-        # Initialize the configuration generator
-        generator = IntelligentConfigGenerator()
+        started = time.perf_counter()
+        response = jsonify({
+            'success': True,
+            **result.to_dict(),
+            'input_text': input_text,
+            **({'profile': profile} if profile else {})
+        })
+        observe_stage(time.perf_counter() - started, 'serialize', vsi_scenario(result.entities))
+        return response
         
-        # Generate configuration
-        vsi_config = generator.generate_configuration(input_text, minimal=minimal)
+    except ProfilerBusy as e:
+        return _error_response(str(e)), 409
+    except Exception as e:
+        return _error_response(str(e))
+
+@app.route('/api/generate/batch', methods=['POST'])
+def generate_batch():
+    """API endpoint to generate configurations for a list of prompts in parallel"""
+    try:
+        data = request.get_json()
         
-        # Extract entities for additional info
-        entities = generator.entity_extractor.extract_comprehensive_entities(input_text)
+        if not isinstance(data, dict) or not isinstance(data.get('items'), list) or not data['items']:
+            return _error_response('A non-empty list of items is required')
+        
+        if len(data['items']) > BATCH_MAX_ITEMS:
+            return _error_response(f'Batch is limited to {BATCH_MAX_ITEMS} items')
+        
+        order = data.get('order', 'input')
+        if order not in ('input', 'completion'):
+            return _error_response("order must be 'input' or 'completion'")
+        
+        items, errors = _parse_batch_items(data)
+        results = _iter_batch_results(items, errors, ordered=(order == 'input'))
+        
+        if data.get('stream'):
+            # One NDJSON record per prompt, written as soon as it is ready
+            def records():
+                try:
+                    for item in results:
+                        BATCH_ITEMS_TOTAL.inc('success' if item['success'] else 'error')
+                        yield app.json.dumps(item) + "\n"
+                except Exception as e:
+                    yield app.json.dumps({'success': False, 'error': str(e)}) + "\n"
+            
+            return Response(stream_with_context(records()), mimetype='application/x-ndjson')
+        
+        results = list(results)
+        succeeded = sum(1 for item in results if item['success'])
+        BATCH_ITEMS_TOTAL.inc('success', amount=succeeded)
+        BATCH_ITEMS_TOTAL.inc('error', amount=len(results) - succeeded)
         
         return jsonify({
             'success': True,
-            'configuration': vsi_config,
-            'entities': entities,
-            'input_text': input_text
+            'count': len(results),
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded,
+            'results': results
         })
         
     except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        })
+        return _error_response(str(e))
 
 @app.route('/api/analyze', methods=['POST'])
 def analyze_text():
@@ -1615,36 +3346,72 @@ def analyze_text():
         input_text = data.get('input_text', '')
         
         if not input_text.strip():
-            return jsonify({
-                'success': False,
-                'error': 'Input text is required'
-            })
-        
-        # Initialize entity extractor
-        extractor = AdvancedNLPEntityExtractor()
-        
-        # Extract entities
-        entities = extractor.extract_comprehensive_entities(input_text)
+            return _error_response('Input text is required')
+        
+        # Shared, process-wide entity extractor
+        extractor = engine.entity_extractor
+        
+        profile = None
+        if data.get('profile'):
+            denied = _profile_denied(data)
+            if denied:
+                return _error_response(denied), 403
+            # A cached extraction would hide the work being profiled
+            entities, profile = _profiled(extractor.extract_comprehensive_entities, input_text, use_cache=False)
+        else:
+            # Extract entities
+            entities = extractor.extract_comprehensive_entities(input_text)
         
         return jsonify({
             'success': True,
             'entities': entities,
-            'input_text': input_text
+            'input_text': input_text,
+            **({'profile': profile} if profile else {})
         })
         
+    except ProfilerBusy as e:
+        return _error_response(str(e)), 409
     except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        })
+        return _error_response(str(e))
+
+@app.route('/api/health', methods=['GET'])
+def health():
+    """Readiness endpoint with cold-start timings"""
+    return jsonify({
+        'success': True,
+        'startup_ms': round(STARTUP_SECONDS * 1000, 1),
+        'startup_budget_ms': STARTUP_BUDGET_MS,
+        'engine_build_ms': round(engine.build_seconds * 1000, 1),
+        'extraction_engine': engine.entity_extractor.effective_engine,
+        'dut_profile': engine.entity_extractor.profile.to_dict(),
+        'spacy_mode': SPACY_MODE,
+        'spacy_loaded': SPACY_AVAILABLE
+    })
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """API endpoint exposing entity and response cache statistics"""
+    return jsonify({
+        'success': True,
+        **engine.cache_stats()
+    })
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint: request, error, cache and per-stage latency metrics"""
+    return Response(METRICS.render(), mimetype='text/plain; version=0.0.4')
 
-print("🛠️ ULTIMATE FIXED Enhanced Intelligent Configuration Generator defined")
+log.info("🛠️ ULTIMATE FIXED Enhanced Intelligent Configuration Generator defined")
 if __name__ == '__main__':
     print("🚀 Starting Enhanced Network Configuration Generator Flask Server")
     print("📋 Available endpoints:")
     print("   GET  /                - Web interface") 
     print("   POST /api/generate    - Generate configuration from text")
+    print("   POST /api/generate/batch - Generate configurations for a list of prompts")
     print("   POST /api/analyze     - Analyze text and extract entities")
+    print("   GET  /api/cache/stats - Entity and response cache statistics")
+    print("   GET  /api/health      - Readiness and cold-start timings")
+    print("   GET  /metrics         - Prometheus metrics")
     print("\n🌐 Server running with enhanced English understanding")
     print("🛑 Press Ctrl+C to stop the server")
     
@@ -0,0 +1,87 @@
+"""Generation time and memory versus chassis size.
+
+Builds a generator per DUT profile (16, 256 and 2048 lines by default)
+and generates every all-lines scenario with caching disabled. Reports
+median time, time per line, peak traced memory and output size, and
+fails when time per line at the largest chassis grows more than
+--max-growth times over the smallest (i.e. generation is not linear).
+
+    python benchmarks/chassis_scaling.py
+    python benchmarks/chassis_scaling.py --lines 16 64 512 4096 --runs 9
+"""
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ['ENTITY_CACHE_SIZE'] = '0'
+os.environ['ENGINE_WARMUP'] = '0'
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import app
+
+SCENARIOS = [
+    ('1:1', "Create 1:1 service for all lines"),
+    ('1:1 translation', "Create 1:1 service for all lines with VLAN translation"),
+    ('N:1', "Create N:1 service for all lines"),
+    ('N:1 untagged', "Create N:1 untagged service for all lines"),
+    ('discretized', "1:1 forwarder for first 8 lines and N:1 forwarder for remaining lines"),
+]
+
+
+def measure(generator, prompt, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = generator.generate(prompt)
+        samples.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    generator.generate(prompt)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(samples), peak, len(result.configuration)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lines', type=int, nargs='+', default=[16, 256, 2048])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-growth', type=float, default=3.0,
+                        help="allowed growth of time per line from the smallest to the largest chassis")
+    args = parser.parse_args(argv)
+
+    print(f"{'lines':>6}  {'scenario':<16}{'median ms':>10}{'us/line':>9}{'peak MB':>9}{'output KB':>11}")
+    per_line = {}
+    for line_count in sorted(args.lines):
+        generator = app.IntelligentConfigGenerator(profile=app.DUTProfile(f'{line_count}-line', line_count))
+        for name, prompt in SCENARIOS:
+            with contextlib.redirect_stdout(io.StringIO()):
+                seconds, peak, size = measure(generator, prompt, args.runs)
+            per_line[line_count, name] = seconds / line_count
+            print(f"{line_count:>6}  {name:<16}{seconds * 1000:>10.2f}{seconds * 1e6 / line_count:>9.1f}"
+                  f"{peak / 2**20:>9.2f}{size / 1024:>11.1f}")
+
+    smallest, largest = min(args.lines), max(args.lines)
+    failures = []
+    for name, _ in SCENARIOS:
+        growth = per_line[largest, name] / per_line[smallest, name]
+        if growth > args.max_growth:
+            failures.append(f"{name}: time per line grew {growth:.1f}x from {smallest} to {largest} lines")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print(f"✅ time per line stays within {args.max_growth:.0f}x from {smallest} to {largest} lines")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
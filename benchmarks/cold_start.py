@@ -0,0 +1,66 @@
+"""Cold-start benchmark: how long a fresh worker takes to import app.py.
+
+Starts a new interpreter per run (like an autoscaled gunicorn worker),
+imports app and reports wall time to ready plus the app's own
+STARTUP_SECONDS. Exits non-zero when the median exceeds the budget.
+
+    python benchmarks/cold_start.py --runs 5 --budget-ms 1500
+    SPACY_MODE=eager python benchmarks/cold_start.py
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import contextlib, io, json, sys
+with contextlib.redirect_stdout(io.StringIO()):
+    import app
+sys.stdout.write(json.dumps({
+    'startup_ms': app.STARTUP_SECONDS * 1000,
+    'engine_build_ms': app.engine.build_seconds * 1000,
+    'spacy_mode': app.SPACY_MODE,
+    'spacy_loaded': app.SPACY_AVAILABLE,
+}))
+"""
+
+
+def run_once() -> dict:
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, capture_output=True, text=True, check=True)
+    sample = json.loads(out.stdout)
+    sample['wall_ms'] = (time.perf_counter() - start) * 1000
+    return sample
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=float(os.environ.get('STARTUP_BUDGET_MS', 1500)))
+    args = parser.parse_args(argv)
+
+    samples = [run_once() for _ in range(args.runs)]
+    wall = statistics.median(s['wall_ms'] for s in samples)
+    startup = statistics.median(s['startup_ms'] for s in samples)
+    build = statistics.median(s['engine_build_ms'] for s in samples)
+
+    print(f"spaCy mode: {samples[0]['spacy_mode']} (loaded: {samples[0]['spacy_loaded']})")
+    print(f"process start to ready (median of {args.runs}): {wall:.0f} ms")
+    print(f"app import (STARTUP_SECONDS):        {startup:.0f} ms")
+    print(f"  of which engine build + warm-up:   {build:.0f} ms")
+    print(f"budget:                              {args.budget_ms:.0f} ms")
+
+    if wall > args.budget_ms:
+        print("❌ over budget")
+        return 1
+    print("✅ within budget")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
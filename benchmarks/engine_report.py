@@ -0,0 +1,166 @@
+"""Latency and agreement report for the regex and matcher extraction engines.
+
+Runs every prompt of the corpus through both engines with caching
+disabled and reports:
+  - per-prompt latency (p50/p95/max) for each engine, plus the matcher
+    engine's throughput when prompts are tokenized with nlp.pipe
+  - how often the two engines extract identical entities and generate
+    identical configurations, and which entity fields disagree
+
+The corpus is the golden prompt corpus (benchmarks/golden/corpus.json),
+or a text file with one prompt per line. Agreement is also checked on
+--fuzz random prompts built from the words and punctuation the patterns
+key on, since 33 prompts cover few of the ways mentions can be written.
+--check exits non-zero on any disagreement.
+
+    python benchmarks/engine_report.py
+    python benchmarks/engine_report.py --fuzz 10000 --seed 7 --check
+    python benchmarks/engine_report.py --prompts prompts.txt --repeat 20 --show-diffs
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+CORPUS_PATH = os.path.join(ROOT, 'benchmarks', 'golden', 'corpus.json')
+
+# Both engines are built side by side: spaCy must be loadable and caches
+# must not hide the extraction cost
+os.environ.setdefault('SPACY_MODE', 'lazy')
+os.environ['ENTITY_CACHE_SIZE'] = '0'
+os.environ['ENGINE_WARMUP'] = '0'
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import app
+
+
+# Keywords of the VLAN/line/PBIT/service patterns, near misses and filler
+FUZZ_WORDS = (
+    "user network vlan valn vlan-tag vlan100 s-vlan id identifier tag line lines line4 online number "
+    "linenumber for on per any all the every sixteen pbit p-bit priority bit different configure create "
+    "service services of type 1:1 n:1 forwarder ipv6 pppoe traffic with without translation untagged & "
+    "first remaining rest and upstream downstream side uplink customer provider send 0 1 2 3 5 7 8 10 16 "
+    "100 101 700 4095 100abc 1,000"
+).split()
+FUZZ_SEPARATORS = (" ", " ", " ", "  ", "", ",", ".", " = ", ":", "-", "\n", " (", ") ")
+
+
+def load_prompts(path=None):
+    if path:
+        with open(path, encoding='utf-8') as f:
+            return [line.strip() for line in f if line.strip()]
+    with open(CORPUS_PATH, encoding='utf-8') as f:
+        return [case['prompt'] for case in json.load(f)]
+
+
+def fuzz_prompts(count, seed):
+    rng = random.Random(seed)
+    return [''.join(rng.choice(FUZZ_WORDS) + rng.choice(FUZZ_SEPARATORS) for _ in range(rng.randint(1, 25)))
+            for _ in range(count)]
+
+
+def compare(regex, matcher, generator, prompts):
+    """(identical entities, identical configurations, per-field disagreement counts, diffs)"""
+    entity_agree = config_agree = 0
+    field_diffs = Counter()
+    diffs = []
+    for prompt in prompts:
+        a = regex.extract_comprehensive_entities(prompt)
+        b = matcher.extract_comprehensive_entities(prompt)
+        if a == b:
+            entity_agree += 1
+        else:
+            fields = sorted(key for key in a if a[key] != b.get(key))
+            field_diffs.update(fields)
+            diffs.append((prompt, {key: (a[key], b.get(key)) for key in fields}))
+        config_a = generator.generate(prompt, entities=a).configuration
+        config_b = generator.generate(prompt, entities=b).configuration
+        config_agree += config_a == config_b
+    return entity_agree, config_agree, field_diffs, diffs
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def time_per_prompt(extract, prompts, repeat):
+    samples = []
+    for _ in range(repeat):
+        for prompt in prompts:
+            start = time.perf_counter()
+            extract(prompt)
+            samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--prompts', help="text file with one prompt per line")
+    parser.add_argument('--repeat', type=int, default=10, help="timing passes over the corpus")
+    parser.add_argument('--fuzz', type=int, default=3000, help="random prompts checked for agreement")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--check', action='store_true', help="exit 1 when the engines disagree")
+    parser.add_argument('--show-diffs', action='store_true', help="print every disagreeing prompt")
+    args = parser.parse_args(argv)
+
+    prompts = load_prompts(args.prompts)
+    regex = app.AdvancedNLPEntityExtractor(engine='regex')
+    matcher = app.AdvancedNLPEntityExtractor(engine='matcher')
+    if not matcher.uses_matcher:
+        print("❌ spaCy is not available; install spacy to compare engines")
+        return 1
+    generator = app.IntelligentConfigGenerator()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        regex_times = time_per_prompt(regex.extract_comprehensive_entities, prompts, args.repeat)
+        matcher_times = time_per_prompt(matcher.extract_comprehensive_entities, prompts, args.repeat)
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            matcher.extract_entities_batch(prompts)
+        pipe_us = (time.perf_counter() - start) * 1e6 / (args.repeat * len(prompts))
+
+        results = [('corpus', len(prompts), *compare(regex, matcher, generator, prompts))]
+        if args.fuzz:
+            results.append(('fuzz', args.fuzz, *compare(regex, matcher, generator, fuzz_prompts(args.fuzz, args.seed))))
+
+    n = len(prompts)
+    print(f"Corpus: {n} prompts, {args.repeat} timing passes, caches disabled")
+    print()
+    print(f"{'engine':<18}{'p50 us':>10}{'p95 us':>10}{'max us':>10}{'mean us':>10}")
+    for name, samples in (('regex', regex_times), ('matcher', matcher_times)):
+        print(f"{name:<18}{percentile(samples, 50):>10.0f}{percentile(samples, 95):>10.0f}"
+              f"{max(samples):>10.0f}{statistics.mean(samples):>10.0f}")
+    print(f"{'matcher (nlp.pipe)':<18}{'':>30}{pipe_us:>10.0f}")
+    print()
+    disagreements = 0
+    for name, total, entity_agree, config_agree, field_diffs, diffs in results:
+        label = name if name == 'corpus' else f"fuzz (seed {args.seed})"
+        print(f"{label}: identical entities {entity_agree}/{total} ({entity_agree / total:.1%}), "
+              f"identical configurations {config_agree}/{total} ({config_agree / total:.1%})")
+        if field_diffs:
+            print("  Disagreeing fields: " + ", ".join(f"{field} ({count})" for field, count in field_diffs.most_common()))
+        disagreements += total - entity_agree
+        if args.show_diffs:
+            for prompt, fields in diffs:
+                print()
+                print(f"- {prompt[:100]!r}")
+                for field, (a, b) in fields.items():
+                    print(f"    {field}: regex={a} matcher={b}")
+    if args.check and disagreements:
+        print(f"❌ the engines disagree on {disagreements} prompt(s)")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""Import-time and memory profile of the request-serving path.
+
+Imports app in a fresh interpreter under `python -X importtime`, then
+reports total import time, the heaviest direct imports and the
+resident set size. --write-baseline records the result in
+benchmarks/baselines/import_baseline.json; --check compares against it
+and fails on regressions or when a module that must stay off the
+serving path (pandas, numpy, IPython, ...) gets imported.
+
+    python benchmarks/import_profile.py
+    python benchmarks/import_profile.py --write-baseline
+    python benchmarks/import_profile.py --check
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'baselines', 'import_baseline.json')
+
+# Must never be imported just by serving requests
+FORBIDDEN_MODULES = ['pandas', 'numpy', 'IPython', 'ipywidgets', 'sklearn', 'nltk', 'spacy']
+
+PROBE = """
+import contextlib, io, json, resource, sys
+with contextlib.redirect_stdout(io.StringIO()):
+    import app
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if sys.platform == 'darwin':
+    rss //= 1024  # bytes on macOS, KiB elsewhere
+sys.stdout.write(json.dumps({
+    'max_rss_kb': rss,
+    'modules': sorted(name for name in sys.modules if '.' not in name),
+}))
+"""
+
+
+def parse_importtime(stderr: str):
+    """Return (total microseconds, [(cumulative us, module)] of second-level imports)"""
+    total, second_level = 0, []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0:
+            total += int(cumulative)
+        elif depth == 1:
+            second_level.append((int(cumulative), name.strip()))
+    return total, second_level
+
+
+def profile_once(env: dict) -> dict:
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROBE],
+                         cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    probe = json.loads(out.stdout)
+    total_us, second_level = parse_importtime(out.stderr)
+    return {
+        'import_ms': total_us / 1000,
+        'max_rss_mb': probe['max_rss_kb'] / 1024,
+        'top_imports': sorted(second_level, reverse=True)[:10],
+        'forbidden_loaded': [name for name in FORBIDDEN_MODULES if name in probe['modules']],
+    }
+
+
+def profile(runs: int) -> dict:
+    env = dict(os.environ, SPACY_MODE=os.environ.get('SPACY_MODE', 'off'))
+    samples = [profile_once(env) for _ in range(runs)]
+    # Fastest run for time (least scheduler noise), median for memory
+    fastest = min(samples, key=lambda s: s['import_ms'])
+    return {
+        'python': sys.version.split()[0],
+        'runs': runs,
+        'import_ms': round(fastest['import_ms'], 1),
+        'max_rss_mb': round(statistics.median(s['max_rss_mb'] for s in samples), 1),
+        'top_imports': [[round(us / 1000, 1), name] for us, name in fastest['top_imports']],
+        'forbidden_loaded': fastest['forbidden_loaded'],
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--write-baseline', action='store_true')
+    parser.add_argument('--check', action='store_true', help="fail on regressions against the baseline")
+    # Import time is noisy on shared hosts; the regressions that matter
+    # (a pandas-sized import) are several times larger than the noise
+    parser.add_argument('--time-tolerance', type=float, default=0.5, help="allowed import time growth (default 50%%)")
+    parser.add_argument('--rss-tolerance', type=float, default=0.2, help="allowed RSS growth (default 20%%)")
+    args = parser.parse_args(argv)
+
+    result = profile(args.runs)
+    print(f"import app: {result['import_ms']:.1f} ms (best of {args.runs}), "
+          f"max RSS {result['max_rss_mb']:.1f} MB, Python {result['python']}")
+    print("heaviest direct imports:")
+    for ms, name in result['top_imports']:
+        print(f"  {ms:8.1f} ms  {name}")
+
+    failures = []
+    if result['forbidden_loaded']:
+        failures.append(f"serving path imports {', '.join(result['forbidden_loaded'])}")
+
+    if args.write_baseline:
+        os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(result, f, indent=2)
+            f.write("\n")
+        print(f"📝 Baseline written to {os.path.relpath(BASELINE_PATH, ROOT)}")
+
+    if args.check:
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)
+        for key, tolerance in (('import_ms', args.time_tolerance), ('max_rss_mb', args.rss_tolerance)):
+            if result[key] > baseline[key] * (1 + tolerance):
+                failures.append(f"{key} {result[key]} exceeds baseline {baseline[key]} (+{tolerance:.0%})")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""Generation throughput with logging off versus on.
+
+Runs the golden corpus through IntelligentConfigGenerator.generate with
+caching disabled, once per logging mode, with log output written to
+os.devnull (a real file write per record, as under gunicorn):
+
+    off         LOG_LEVEL=INFO, the default: extraction traces are skipped
+    debug-text  LOG_LEVEL=DEBUG, LOG_FORMAT=text
+    debug-json  LOG_LEVEL=DEBUG, LOG_FORMAT=json
+
+Reports prompts/sec per mode (best of --rounds) and the slowdown over "off".
+
+    python benchmarks/logging_overhead.py
+    python benchmarks/logging_overhead.py --passes 50 --rounds 5
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+CORPUS_PATH = os.path.join(ROOT, 'benchmarks', 'golden', 'corpus.json')
+
+os.environ['ENTITY_CACHE_SIZE'] = '0'
+os.environ['ENGINE_WARMUP'] = '0'
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import app
+
+MODES = (
+    ('off', logging.INFO, logging.Formatter('%(message)s')),
+    ('debug-text', logging.DEBUG, logging.Formatter('%(message)s')),
+    ('debug-json', logging.DEBUG, app.JSONLogFormatter()),
+)
+
+
+def throughput(generator, prompts, passes, rounds):
+    """Best prompts/sec over the rounds, and the log lines written per pass"""
+    best = 0.0
+    for _ in range(rounds):
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            for _ in range(passes):
+                for prompt in prompts:
+                    generator.generate(prompt)
+            elapsed = time.perf_counter() - start
+        best = max(best, passes * len(prompts) / elapsed)
+
+    # Count the records of one pass separately, outside the timed loop
+    sink = io.StringIO()
+    with contextlib.redirect_stdout(sink):
+        for prompt in prompts:
+            generator.generate(prompt)
+    return best, sink.getvalue().count("\n")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--passes', type=int, default=20, help="passes over the corpus per round")
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    with open(CORPUS_PATH, encoding='utf-8') as f:
+        prompts = [case['prompt'] for case in json.load(f)]
+    generator = app.IntelligentConfigGenerator()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for prompt in prompts:  # warm-up: regex compilation, lazy setup
+            generator.generate(prompt)
+
+    level, formatter = app.log.level, app._log_handler.formatter
+    results = []
+    try:
+        for name, mode_level, mode_formatter in MODES:
+            app.log.setLevel(mode_level)
+            app._log_handler.setFormatter(mode_formatter)
+            results.append((name, *throughput(generator, prompts, args.passes, args.rounds)))
+    finally:
+        app.log.setLevel(level)
+        app._log_handler.setFormatter(formatter)
+
+    print(f"Corpus: {len(prompts)} prompts, {args.passes} passes x {args.rounds} rounds, caches disabled")
+    print(f"{'mode':<12}{'prompts/s':>11}{'lines/pass':>12}{'vs off':>9}")
+    baseline = results[0][1]
+    for name, per_sec, lines in results:
+        print(f"{name:<12}{per_sec:>11.0f}{lines:>12}{per_sec / baseline - 1:>+9.1%}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
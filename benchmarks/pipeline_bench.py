@@ -0,0 +1,207 @@
+"""Per-stage benchmark over the golden prompt corpus.
+
+Runs every prompt of benchmarks/golden/corpus.json through the pipeline
+stage by stage with caching disabled:
+
+    preprocess  AdvancedNLPEntityExtractor._preprocess_text
+    extract     AdvancedNLPEntityExtractor.extract_comprehensive_entities
+    vsi         IntelligentConfigGenerator._generate_vsi_configuration
+    traffic     IntelligentConfigGenerator._generate_traffic_configuration
+    render      VSI and traffic text rendering
+
+checks each configuration against its golden copy and reports p50/p95/p99
+and throughput per stage. --check compares against
+benchmarks/baselines/pipeline_baseline.json and fails on golden
+mismatches or when a stage's p50 or p95 regresses beyond --tolerance.
+
+    python benchmarks/pipeline_bench.py
+    python benchmarks/pipeline_bench.py --check
+    python benchmarks/pipeline_bench.py --write-baseline
+    python benchmarks/pipeline_bench.py --write-golden   # after an intentional output change
+"""
+import argparse
+import contextlib
+import difflib
+import io
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+CORPUS_PATH = os.path.join(ROOT, 'benchmarks', 'golden', 'corpus.json')
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'baselines', 'pipeline_baseline.json')
+
+os.environ['ENTITY_CACHE_SIZE'] = '0'
+os.environ['ENGINE_WARMUP'] = '0'
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import app
+
+STAGES = ('preprocess', 'extract', 'vsi', 'traffic', 'render')
+
+# Worked examples from the project notebook, on top of the Book 1.xlsx procedures
+NOTEBOOK_PROMPTS = [
+    "Configure DUT for a Service with 1:1 Forwarder and Ensure that bi-directional Traffic is fine.",
+    "Configure DUT for a Service with N:1 Forwarder and Ensure that bi-directional Traffic is fine for all Lines",
+    "Configure DUT for a service with 1:1 Forwarder for first 8 lines and N:1 Forwarder for remaining 8 lines and validate bidirectional traffic",
+    "Configure DUT for a service with N:1 forwarder for the line 1 with Untagged VLAN ID.",
+    "Configure DUT for N:1 service for line 1 and line 2 and validate v6 traffic",
+    "Configure DUT for N:1 service for any 2 lines and validate PPP traffic",
+    "Configure DUT for N:1 service without VLAN translation and validate traffic for any 2 lines.",
+    "Configure DUT for 1:1 service without VLAN translation for all lines and validate traffic",
+    "Configure DUT for 1:1 service for line 4, line 8, line 12 and line 16 and validate traffic for all Pbit",
+    "Create three 1:1 services for line 1 and validate Traffic, use different pbit for each service.",
+    "Create Three N:1 services for line 1 and line 2 and validate Traffic for each service different Pbit.",
+    "Configure 8 Services per line 1 and validate traffic for all services",
+    "Configure 3 Services per line 10 and ensure bi-directional traffic is fine",
+]
+
+
+def seed_prompts():
+    """(source, prompt) pairs: Book 1.xlsx procedures, notebook examples, engine warm-up prompts"""
+    from process_test_cases import iter_sheet_rows
+    seeded = []
+    for row_num, row in iter_sheet_rows(os.path.join(ROOT, 'Book 1.xlsx')):
+        text = str(row.get('Test Procedure') or '').strip()
+        if text:
+            seeded.append((f"Book 1.xlsx row {row_num}", text))
+    seeded += [('notebook', prompt) for prompt in NOTEBOOK_PROMPTS]
+    seeded += [('warm-up', prompt) for prompt in app.GeneratorEngine.WARMUP_PROMPTS]
+
+    seen, unique = set(), []
+    for source, prompt in seeded:
+        if prompt not in seen:
+            seen.add(prompt)
+            unique.append((source, prompt))
+    return unique
+
+
+def write_golden(generator):
+    corpus = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for source, prompt in seed_prompts():
+            corpus.append({'source': source, 'prompt': prompt,
+                           'configuration': generator.generate(prompt).configuration})
+    os.makedirs(os.path.dirname(CORPUS_PATH), exist_ok=True)
+    with open(CORPUS_PATH, 'w', encoding='utf-8') as f:
+        json.dump(corpus, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    print(f"📝 {len(corpus)} golden configurations written to {os.path.relpath(CORPUS_PATH, ROOT)}")
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run(generator, corpus, passes):
+    """Per-stage samples in microseconds, and the prompts whose output differs from golden"""
+    extractor = generator.entity_extractor
+    samples = {stage: [] for stage in STAGES}
+    mismatches = []
+    clock = time.perf_counter
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for pass_num in range(passes):
+            for case in corpus:
+                prompt = case['prompt']
+                t0 = clock()
+                extractor._preprocess_text(prompt)
+                t1 = clock()
+                entities = extractor.extract_comprehensive_entities(prompt)
+                t2 = clock()
+                vsi = generator._generate_vsi_configuration(entities)
+                t3 = clock()
+                traffic = generator._generate_traffic_configuration(entities, vsi)
+                t4 = clock()
+                configuration = vsi.render() + "\n" + traffic.render()
+                t5 = clock()
+
+                for stage, start, end in zip(STAGES, (t0, t1, t2, t3, t4), (t1, t2, t3, t4, t5)):
+                    samples[stage].append((end - start) * 1e6)
+                if pass_num == 0 and configuration != case['configuration']:
+                    mismatches.append((case, configuration))
+    return samples, mismatches
+
+
+def summarize(samples):
+    summary = {}
+    for stage, values in samples.items():
+        total = sum(values)
+        summary[stage] = {
+            'p50_us': round(percentile(values, 50), 1),
+            'p95_us': round(percentile(values, 95), 1),
+            'p99_us': round(percentile(values, 99), 1),
+            'per_sec': round(len(values) / (total / 1e6), 1) if total else 0.0,
+        }
+    end_to_end = [sum(parts) for parts in zip(*(samples[stage] for stage in STAGES))]
+    summary['total'] = {
+        'p50_us': round(percentile(end_to_end, 50), 1),
+        'p95_us': round(percentile(end_to_end, 95), 1),
+        'p99_us': round(percentile(end_to_end, 99), 1),
+        'per_sec': round(len(end_to_end) / (sum(end_to_end) / 1e6), 1),
+    }
+    return summary
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--passes', type=int, default=20, help="timed passes over the corpus")
+    parser.add_argument('--check', action='store_true', help="fail on regressions against the baseline")
+    parser.add_argument('--write-baseline', action='store_true')
+    parser.add_argument('--write-golden', action='store_true', help="regenerate the golden corpus (needs openpyxl)")
+    parser.add_argument('--tolerance', type=float, default=0.5, help="allowed p50/p95 growth per stage (default 50%%)")
+    parser.add_argument('--show-diffs', action='store_true', help="print a diff for every golden mismatch")
+    args = parser.parse_args(argv)
+
+    generator = app.IntelligentConfigGenerator()
+    if args.write_golden:
+        write_golden(generator)
+    with open(CORPUS_PATH, encoding='utf-8') as f:
+        corpus = json.load(f)
+
+    run(generator, corpus, 1)  # warm-up: regex compilation, lazy setup
+    samples, mismatches = run(generator, corpus, args.passes)
+    summary = summarize(samples)
+
+    print(f"Corpus: {len(corpus)} prompts, {args.passes} passes, caches disabled")
+    print(f"{'stage':<12}{'p50 us':>10}{'p95 us':>10}{'p99 us':>10}{'per sec':>12}")
+    for stage, stats in summary.items():
+        print(f"{stage:<12}{stats['p50_us']:>10.1f}{stats['p95_us']:>10.1f}{stats['p99_us']:>10.1f}{stats['per_sec']:>12.0f}")
+    print(f"Golden: {len(corpus) - len(mismatches)}/{len(corpus)} identical")
+
+    failures = [f"output differs from golden: {case['source']}: {case['prompt'][:80]!r}" for case, _ in mismatches]
+    if args.show_diffs:
+        for case, configuration in mismatches:
+            sys.stdout.writelines(difflib.unified_diff(
+                case['configuration'].splitlines(True), configuration.splitlines(True),
+                fromfile='golden', tofile='current'))
+            print()
+
+    if args.write_baseline:
+        os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'passes': args.passes,
+                       'prompts': len(corpus), 'stages': summary}, f, indent=2)
+            f.write("\n")
+        print(f"📝 Baseline written to {os.path.relpath(BASELINE_PATH, ROOT)}")
+
+    if args.check:
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)['stages']
+        for stage, stats in summary.items():
+            for metric in ('p50_us', 'p95_us'):
+                allowed = baseline[stage][metric] * (1 + args.tolerance)
+                if stats[metric] > allowed:
+                    failures.append(f"{stage} {metric} {stats[metric]} exceeds baseline "
+                                    f"{baseline[stage][metric]} (+{args.tolerance:.0%})")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
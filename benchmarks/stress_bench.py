@@ -0,0 +1,131 @@
+"""Worst-case extraction latency versus prompt length.
+
+Feeds the entity extractor adversarial prompts of growing length with
+caching disabled:
+
+    untagged        "untagged vlan " repeated: every anchor starts an
+                    untagged pattern whose .*? gaps never close
+    discretization  "<n> lines 1:1 forwarder first <n> lines and ..."
+                    repeated: the discretization patterns almost match
+                    at every position
+    paragraph       a realistic multi-service request repeated
+
+Reports median and worst time per prompt and time per KB, and fails when
+time per KB at the longest prompt grows more than --max-growth times over
+the shortest (i.e. scanning is not linear). Also checks that a prompt
+over MAX_INPUT_CHARS is rejected without being scanned.
+
+--compare-re times plain re.search over the same gapped patterns, which
+backtracks quadratically or worse; it is limited to prompts of at most
+--re-limit characters so the run finishes.
+
+    python benchmarks/stress_bench.py
+    python benchmarks/stress_bench.py --lengths 1000 8000 64000 --runs 7 --compare-re
+"""
+import argparse
+import contextlib
+import io
+import os
+import re
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ['ENTITY_CACHE_SIZE'] = '0'
+os.environ['ENGINE_WARMUP'] = '0'
+os.environ.setdefault('SCAN_DEADLINE_MS', '0')  # measure the full scan, never cut it short
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import app
+
+PARAGRAPH = ("Configure 1:1 service for first 8 lines with VLAN translation and N:1 untagged "
+             "service for remaining lines, PBIT 3 on S-VLAN 100. ")
+
+
+def repeated(unit, length):
+    return (unit * (length // len(unit) + 1))[:length]
+
+
+GENERATORS = {
+    'untagged': lambda n: repeated("untagged vlan ", n),
+    'discretization': lambda n: "rest " + repeated("8 lines 1:1 forwarder first 8 lines and ", n - 5),
+    'paragraph': lambda n: repeated(PARAGRAPH, n),
+}
+
+
+def measure(extractor, text, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        extractor.extract_comprehensive_entities(text)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), max(samples)
+
+
+def raw_re(extractor, text):
+    """Time plain re.search over the patterns GapPattern replaces"""
+    patterns = [re.compile(p, re.IGNORECASE) for p in extractor.discretization_patterns]
+    patterns += [matcher.regex for matcher in extractor.scanner.gapped.values()]
+    start = time.perf_counter()
+    for pattern in patterns:
+        pattern.search(text)
+    return time.perf_counter() - start
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lengths', type=int, nargs='+', default=[1000, 4000, 16000, 64000])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-growth', type=float, default=3.0,
+                        help="allowed growth of time per KB from the shortest to the longest prompt")
+    parser.add_argument('--compare-re', action='store_true', help="also time plain re.search")
+    parser.add_argument('--re-limit', type=int, default=4000,
+                        help="longest prompt timed with --compare-re")
+    args = parser.parse_args(argv)
+
+    if app.MAX_INPUT_CHARS and max(args.lengths) > app.MAX_INPUT_CHARS:
+        parser.error(f"lengths must not exceed MAX_INPUT_CHARS ({app.MAX_INPUT_CHARS})")
+
+    extractor = app.AdvancedNLPEntityExtractor(engine='regex')
+    print(f"{'chars':>7}  {'prompt':<16}{'median ms':>10}{'max ms':>9}{'us/KB':>9}"
+          + (f"{'re ms':>11}" if args.compare_re else ""))
+    per_kb = {}
+    for length in sorted(args.lengths):
+        for name, generate in GENERATORS.items():
+            text = generate(length)
+            median, worst = measure(extractor, text, args.runs)
+            per_kb[length, name] = median / (length / 1024)
+            row = (f"{length:>7}  {name:<16}{median * 1000:>10.2f}{worst * 1000:>9.2f}"
+                   f"{per_kb[length, name] * 1e6:>9.0f}")
+            if args.compare_re:
+                row += f"{raw_re(extractor, text) * 1000:>11.1f}" if length <= args.re_limit else f"{'-':>11}"
+            print(row)
+
+    failures = []
+    if app.MAX_INPUT_CHARS:
+        text = repeated("untagged vlan ", app.MAX_INPUT_CHARS + 1)
+        start = time.perf_counter()
+        try:
+            extractor.extract_comprehensive_entities(text)
+            failures.append(f"a {len(text)}-character prompt was not rejected")
+        except ValueError:
+            print(f"{len(text):>7}  {'over limit':<16}{(time.perf_counter() - start) * 1000:>10.2f}  rejected")
+
+    shortest, longest = min(args.lengths), max(args.lengths)
+    for name in GENERATORS:
+        growth = per_kb[longest, name] / per_kb[shortest, name]
+        if growth > args.max_growth:
+            failures.append(f"{name}: time per KB grew {growth:.1f}x from {shortest} to {longest} chars")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print(f"✅ time per KB stays within {args.max_growth:.0f}x from {shortest} to {longest} chars")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,164 @@
+"""Command-line test-case processor.
+
+Generates configurations for every row of an xlsx/CSV test-case sheet
+(the `Test Procedure` / `Output` layout of Book 1.xlsx), fanning rows
+out to worker processes. Rows are streamed from the sheet and results
+are written as they arrive, so memory stays flat for large regression
+sheets.
+
+    python process_test_cases.py "Book 1.xlsx" -o results.txt
+    python process_test_cases.py regression.csv --output-dir configs/ --workers 8
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+from typing import Dict, Any, Iterator, Optional, Tuple
+
+from app import BatchExecutor
+
+
+def iter_sheet_rows(path: str, sheet: Optional[str] = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Yield (sheet row number, {column: value}) for each data row of an xlsx or CSV file"""
+    if path.lower().endswith('.csv'):
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            for row_num, row in enumerate(csv.DictReader(f), start=2):
+                yield row_num, row
+        return
+
+    try:
+        import openpyxl
+    except ImportError:
+        raise SystemExit("openpyxl is required to read .xlsx files (pip install openpyxl)")
+
+    # read_only streams rows instead of loading the whole workbook
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet] if sheet else workbook.worksheets[0]
+        rows = worksheet.iter_rows(values_only=True)
+        header = [str(cell).strip() if cell is not None else '' for cell in next(rows, ())]
+        for row_num, values in enumerate(rows, start=2):
+            yield row_num, dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+def _cell_text(value: Any) -> str:
+    return '' if value is None else str(value).strip()
+
+
+class ResultWriter:
+    """Writes each generated configuration as soon as it is available.
+
+    Either appends a block per row to a single text file or writes one
+    row_<n>.txt file per row into a directory.
+    """
+
+    def __init__(self, output_file: Optional[str] = None, output_dir: Optional[str] = None):
+        self.output_dir = output_dir
+        self._file = None
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        else:
+            self._file = open(output_file, 'w', encoding='utf-8')
+
+    def write(self, result: Dict[str, Any], expected: str = ''):
+        row = result['index']
+        body = result['configuration'] if result['success'] else f"ERROR: {result['error']}"
+
+        if self.output_dir:
+            with open(os.path.join(self.output_dir, f"row_{row:06d}.txt"), 'w', encoding='utf-8') as f:
+                f.write(body + "\n")
+            return
+
+        f = self._file
+        f.write(f"TEST CASE (row {row})\n")
+        f.write("=" * 50 + "\n")
+        f.write("INPUT (Test Procedure):\n")
+        f.write("-" * 30 + "\n")
+        f.write(result['input_text'] + "\n\n")
+        f.write("GENERATED OUTPUT:\n")
+        f.write("-" * 30 + "\n")
+        f.write(body + "\n\n")
+        if expected:
+            f.write("EXPECTED OUTPUT:\n")
+            f.write("-" * 30 + "\n")
+            f.write(expected + "\n\n")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def process_test_cases(input_path: str, output_file: Optional[str] = None, output_dir: Optional[str] = None,
+                       sheet: Optional[str] = None, input_column: str = 'Test Procedure',
+                       expected_column: str = 'Output', minimal: bool = True,
+                       workers: Optional[int] = None, chunk_size: int = 16,
+                       progress_every: int = 1000) -> Dict[str, Any]:
+    """Generate a configuration per row and return throughput statistics"""
+    executor = BatchExecutor(max_workers=workers, chunksize=chunk_size)
+    writer = ResultWriter(output_file, output_dir)
+    expected_by_row = {}  # only rows currently in flight
+    stats = {'rows': 0, 'skipped': 0, 'errors': 0}
+
+    def items() -> Iterator[Tuple[int, str, bool]]:
+        for row_num, row in iter_sheet_rows(input_path, sheet):
+            if input_column not in row:
+                raise SystemExit(f"Missing column {input_column!r}. Available columns: {list(row)}")
+            test_input = _cell_text(row[input_column])
+            if not test_input:
+                stats['skipped'] += 1
+                continue
+            expected_by_row[row_num] = _cell_text(row.get(expected_column))
+            yield row_num, test_input, minimal
+
+    print(f"📖 Processing {input_path} with {executor.max_workers} worker(s)")
+    start = time.perf_counter()
+    try:
+        for result in executor.iter_results(items(), ordered=True):
+            writer.write(result, expected_by_row.pop(result['index'], ''))
+            stats['rows'] += 1
+            if not result['success']:
+                stats['errors'] += 1
+            if progress_every and stats['rows'] % progress_every == 0:
+                elapsed = time.perf_counter() - start
+                print(f"🔄 {stats['rows']} rows, {stats['rows'] / elapsed:.1f} rows/sec")
+    finally:
+        writer.close()
+        executor.shutdown()
+
+    stats['seconds'] = time.perf_counter() - start
+    stats['rows_per_sec'] = stats['rows'] / stats['seconds'] if stats['seconds'] else 0.0
+    return stats
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Generate configurations for an xlsx/CSV test-case sheet in parallel")
+    parser.add_argument('input', help="xlsx or csv file with a test procedure column")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument('-o', '--output', help="text file receiving one block per row")
+    output.add_argument('--output-dir', help="directory receiving one row_<n>.txt per row")
+    parser.add_argument('--sheet', help="worksheet name (default: first sheet)")
+    parser.add_argument('--input-column', default='Test Procedure')
+    parser.add_argument('--expected-column', default='Output')
+    parser.add_argument('--full', action='store_true', help="include traffic configuration (default: VSI only)")
+    parser.add_argument('--workers', type=int, help="worker processes (default: CPU count)")
+    parser.add_argument('--chunk-size', type=int, default=16, help="rows per worker task")
+    parser.add_argument('--progress-every', type=int, default=1000, help="rows between progress lines (0 = off)")
+    args = parser.parse_args(argv)
+
+    stats = process_test_cases(
+        args.input, output_file=args.output, output_dir=args.output_dir, sheet=args.sheet,
+        input_column=args.input_column, expected_column=args.expected_column,
+        minimal=not args.full, workers=args.workers, chunk_size=args.chunk_size,
+        progress_every=args.progress_every,
+    )
+
+    print(f"✅ {stats['rows']} rows in {stats['seconds']:.2f}s "
+          f"({stats['rows_per_sec']:.1f} rows/sec), {stats['errors']} errors, {stats['skipped']} skipped")
+    return 1 if stats['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())